@@ -41,14 +41,36 @@ import numpy as np
 import copy
 import csv
 import classifier
+import segmentation_model
+import spatial_relation
+import label_graph
+import shape_context
+import stroke_index
+import preprocessing
+import stroke_collision
 from scipy.sparse.csgraph import minimum_spanning_tree
 from scipy.sparse import csr_matrix
 import subprocess
-import shutil
+import time
+import multiprocessing
 
 sys.setrecursionlimit(10000)
-## load the classifier
-KENNY_CLASSIFIER = classifier.Classifier('tree_39.txt', None)
+
+## the model files and the CROHMELib tools are found next to this file, whatever the working directory
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+
+## the boosted C4.5 symbol classifier
+SYMBOL_CLASSIFIER_FILE = os.path.join(MODEL_DIR, 'tree_39.txt')
+
+## the PCA coefficients and the AdaBoost classifier used for segmentation
+SEGMENTATION_COEFF_FILE = os.path.join(MODEL_DIR, 'TrainCOEFF.txt')
+SEGMENTATION_ADABOOST_FILE = os.path.join(MODEL_DIR, 'Train5000iteration')
+
+## the SVM and the PCA matrix of the spatial relationship classifier
+RELATION_MODEL_FILE = os.path.join(MODEL_DIR, 'MODhbp.svm')
+RELATION_PCA_FILE = os.path.join(MODEL_DIR, 'MAT.pca')
+
+CROHMELIB_DIR = os.path.join(MODEL_DIR, 'crohmelib', 'bin')
 
 WIDE_THRESHOLD = 2.5
 NARROW_THRESHOLD = 0.3
@@ -205,16 +227,27 @@ class Equation(object):
                 
                
 
-        def lei_CROHME2013_segment(self):
+        ## symbol_cache (classifier.ClassificationCache) keeps the confidences of the stroke groups of the
+        ## expression, one is made for the segmentation when it is not given
+        def lei_CROHME2013_segment(self, seg_model, symbol_classifier, symbol_cache = None):
                  
                   O_eq = copy.deepcopy(self)
+                  if symbol_cache is None:
+                          symbol_cache = classifier.ClassificationCache(symbol_classifier, get_traces(O_eq))
                   ## merge touching strokes
                   self.merge_touching()
 
                   ## preprocessing the input equation
                   self = equation_preprocessing(self)
                   pairs = zip(self.strokes.values(), self.strokes.values()[1:])
-                  for s1, s2 in pairs:  
+                  ## global shape context features of all the reference strokes at once
+                  global_scfs = get_global_scfs(self, [s1 for s1, s2 in pairs])
+                  ## the stroke distances shared by the features of all the pairs
+                  distance_cache = self.get_distance_cache()
+                  ## the two sets of the classification scores of all the pairs
+                  two_CCs = get_two_CCs([(s1.id, s2.id) for s1, s2 in pairs], symbol_cache)
+                  pair_features = []
+                  for (s1, s2), global_scf, two_CC in zip(pairs, global_scfs, two_CCs):  
                           current_stroke = s1
                           next_stroke = s2
                           eq = self
@@ -223,65 +256,45 @@ class Equation(object):
                           foreground_scf = current_stroke.context_shape_features_1NN(next_stroke)
                           ## background shape context feature
                           background_scf = get_3NN_background_scf(eq, current_stroke)
-                          ## global shape context feature
-                          global_scf = get_global_scf(eq,current_stroke)
-
-                          temp_feature = current_stroke.features(next_stroke)
-
-                          O_current_stroke = O_eq.strokes[s1.id]
-                          O_next_stroke = O_eq.strokes[s2.id]
-                          ## get the two sets of the classification scores
-                          two_CC = get_two_CC(O_current_stroke, O_next_stroke)
+                          temp_feature = current_stroke.features(next_stroke, distance_cache)
 
                           ## get all the features
                           all_feature = foreground_scf + background_scf + global_scf + temp_feature + two_CC
-                          all_feature = np.array(all_feature)
-
-                          ## get the PCA coefficient
-                          COEFF = np.loadtxt('TrainCOEFF.txt', delimiter = ',')
-                          ## load the AdaBoost classifier
-                          all_classifiers = np.loadtxt('Train5000iteration', delimiter = ',')
-
-                          ## get the PCA features
-                          PCA_all_feature = []
-                          component_num = 100
-                          for i in range(component_num):
-                                  one_component = COEFF[:,i]
-                                  PCA_all_feature.append(sum(all_feature*one_component))
-
-                          ## use the AdaBoost classifier to do the classification
-                          sum_h = 0
-                          one_feature_vector = np.array(PCA_all_feature)
-                          iteration_num = len(all_classifiers)
-                          
-                          for i in range(iteration_num):
-                                  one_feature = one_feature_vector[all_classifiers[i][0]]
-                                  if (one_feature < all_classifiers[i][1]):
-                                          sum_h += (1.0*all_classifiers[i][2])
-                                  else:
-                                          sum_h += (1.0*all_classifiers[i][3])
+                          pair_features.append(all_feature)
+
+                  ## use the AdaBoost classifier on the PCA features of all the pairs at once
+                  all_sum_h = seg_model.margins(pair_features)
 
+                  for (s1, s2), sum_h in zip(pairs, all_sum_h):
                           if sum_h > 0:
                                   self.segments.merge_strokes(s1.id, s2.id)
                                             
 
 
                                                 
+        ## only the stroke pairs with overlapping bounding boxes are tested, all together, and they
+        ## are merged in the same order as itertools.combinations
         def merge_touching(self):
-                for s1, s2 in itertools.combinations(self.strokes.values(), 2):
-                        if s1.bb_intersects(s2):
-                                if s1.intersects(s2):
-                                        self.segments.merge_strokes(s1.id, s2.id)
+                pairs = stroke_collision.overlapping_stroke_pairs(self.strokes.values())
+                for (s1, s2), touching in zip(pairs, stroke_collision.intersecting_stroke_pairs(pairs)):
+                        if touching:
+                                self.segments.merge_strokes(s1.id, s2.id)
                         
         def find_closest_stroke(self, stroke):
-                d = 9001
-                closest = -1
-                for id, s in self.strokes.items():
-                        if s != stroke:
-                                if d > closest_distance(s, stroke):
-                                        closest = id
-                                        d = closest_distance(s, stroke)
-                return closest
+                return self.get_stroke_index().nearest_other_stroke(stroke)
+
+        ## the spatial index of the strokes, it is built again when the strokes have been replaced
+        def get_stroke_index(self):
+                if not (hasattr(self, '_stroke_index') and self._stroke_index.indexes(self.strokes)):
+                        self._stroke_index = stroke_index.StrokeIndex(self.strokes, self.get_distance_cache())
+                return self._stroke_index
+
+        ## the minimum and maximum distances of the stroke pairs, it is started again when the
+        ## strokes have been replaced
+        def get_distance_cache(self):
+                if not (hasattr(self, '_distance_cache') and self._distance_cache.indexes(self.strokes)):
+                        self._distance_cache = stroke_index.StrokeDistanceCache(self.strokes)
+                return self._distance_cache
                 
         def avg_extents(self):
                 if not hasattr(self, '_avg_extents'):
@@ -317,13 +330,14 @@ class Equation(object):
                 
         def merge_dots(self):
                 avg_width, avg_heigh, avg_diag  = self.avg_extents()
+                distance_cache = self.get_distance_cache()
                 for s in self.get_dots(NARROW_THRESHOLD):
                         neighbors = []
                         if s.id - 1 in self.strokes:
                                 neighbors.append(self.strokes[s.id - 1])
                         if s.id + 1 in self.strokes:
                                 neighbors.append(self.strokes[s.id + 1])
-                        closest = reduce(lambda x,y: x if x.closest_distance(s) < y.closest_distance(s) else y, neighbors)
+                        closest = reduce(lambda x,y: x if distance_cache.closest_distance(x, s) < distance_cache.closest_distance(y, s) else y, neighbors)
                         self.segments.merge_strokes(s.id, closest.id)
 
                                 
@@ -506,43 +520,84 @@ class FuzzySegment(Segment):
                 return newset
                 
 class Stroke(object):
+        ## the points are kept in one (n, 2) float array, the list of point tuples is only built
+        ## when it is asked for, and the geometry of the stroke is computed once
+        __slots__ = ('id', 'array', '_points', '_extents', '_center', '_centroid', '_half_diag', '_arc_length')
+
         def __init__(self, id, points):
                 self.id = id
                 self.points = points
+
+        ## the points as a list of (x, y) tuples, kept for the code that reads them one by one
+        @property
+        def points(self):
+                if self._points is None:
+                        self._points = map(tuple, self.array.tolist())
+                return self._points
+
+        ## points can be a list of tuples or an array with one point per row
+        @points.setter
+        def points(self, points):
+                self.array = np.array(points, dtype = float).reshape(len(points), -1) if len(points) else np.zeros((0, 2))
+                self._points = None
+                self._extents = None
+                self._center = None
+                self._centroid = None
+                self._half_diag = None
+                self._arc_length = None
+
+        def __getstate__(self):
+                return self.id, self.array
+
+        def __setstate__(self, state):
+                self.id, self.points = state
         
         def __eq__(self, other):
-                return self.id == other.id and self.points == other.points
+                return self.id == other.id and np.array_equal(self.array, other.array)
                 
         def __ne__(self, other):
                 return not self == other
 
         def __hash__(self):
-                return hash((id, str(self.points)))
+                return hash(self.id)
 
         def __repr__(self):
                 return 'Stroke(id=%d)' % self.id
                 
         @property
         def extents(self):
-                if not (hasattr(self, '_mins') and hasattr(self, '_maxs')):
-                        mins = list(self.points[0])
-                        maxs = list(self.points[0])
-                
-                        for point in self.points:
-                                mins = zipwith(min, mins, point)
-                                maxs = zipwith(max, maxs, point)
-                        self._mins, self._maxs = tuple(mins), tuple(maxs)
-                return self._mins, self._maxs
+                if self._extents is None:
+                        self._extents = tuple(self.array.min(axis = 0).tolist()), tuple(self.array.max(axis = 0).tolist())
+                return self._extents
                 
         @property
         def center(self):
-                mins, maxs = self.extents
-                box = zipwith(lambda x,y: abs(x - y), mins, maxs)
-                return zipwith(lambda m,b: m + (float(b) / 2), mins, box)
+                if self._center is None:
+                        mins, maxs = self.extents
+                        box = zipwith(lambda x,y: abs(x - y), mins, maxs)
+                        self._center = tuple(zipwith(lambda m,b: m + (float(b) / 2), mins, box))
+                return list(self._center)
+
+        ## average of the points
+        @property
+        def centroid(self):
+                if self._centroid is None:
+                        self._centroid = tuple(np.average(self.array, 0))
+                return self._centroid
                 
         @property
         def half_diag(self):
-                return distance(*self.extents) / 2
+                if self._half_diag is None:
+                        self._half_diag = distance(*self.extents) / 2
+                return self._half_diag
+
+        ## length of the path through the points
+        @property
+        def arc_length(self):
+                if self._arc_length is None:
+                        steps = np.diff(self.array, axis = 0)
+                        self._arc_length = float(shape_context.point_distance(steps[:,0], steps[:,1]).sum())
+                return self._arc_length
                 
         @property
         def width(self):
@@ -570,39 +625,31 @@ class Stroke(object):
 
 
         def closest_distance(self, other):
-                ret = distance(self.points[0], other.points[0])
-                for x in self.points:
-                        for y in other.points:
-                                ret = min(ret, distance(x, y))
-                return ret
+                return stroke_index.closest_point_distance(self.array, other.array)
 
         ## define the farest distance
         def farest_distance(self, other):
-                ret = distance(self.points[0], other.points[0])
-                for x in self.points:
-                        for y in other.points:
-                                ret = max(ret, distance(x, y))
-                return ret
+                return stroke_index.farest_point_distance(self.array, other.array)
         
 
-        ## get all the geometric features       
-        def features(self, other):
+        ## get all the geometric features, the stroke distances come from distance_cache if it is given
+        def features(self, other, distance_cache = None):
+                 if distance_cache is None:
+                         closest_distance, farest_distance = self.closest_distance(other), self.farest_distance(other)
+                 else:
+                         closest_distance, farest_distance = distance_cache.distances(self, other)
                  all_features = []                 
                  ## 1st feature, minimal distance between the two strokes/average of diagonal
                  if (self.average_diag(other) * 2):
-                         first_feature = self.closest_distance(other) / (self.average_diag(other) * 2)
+                         first_feature = closest_distance / (self.average_diag(other) * 2)
                  else:
                          first_feature = 0
                  all_features.append(first_feature)
 
                  ## second, third and forth features are from Shi's paper "a unified framework for symbol segmentation and
                  ## recognition of handwritten mathematical expressions". But the details how to get the horizontal, vertical and size thresholds are missing
-                 Points1 = self.points
-                 Points2 = other.points
-                 PointsArray1 = np.array(Points1)
-                 PointsArray2 = np.array(Points2)
-                 MeanX1, MeanY1 = np.average(PointsArray1,0)
-                 MeanX2, MeanY2 = np.average(PointsArray2,0)
+                 MeanX1, MeanY1 = self.centroid
+                 MeanX2, MeanY2 = other.centroid
                  
                  ## 2nd feature, horizontal distance ratio
                  HorDist = abs(MeanX1 - MeanX2)
@@ -706,7 +753,7 @@ class Stroke(object):
 
                  ## 13th feature, maximal distance between the two strokes/average of diagonal
                  if (self.average_diag(other) * 2):
-                         thirteenth_feature = self.farest_distance(other) / (self.average_diag(other) * 2)
+                         thirteenth_feature = farest_distance / (self.average_diag(other) * 2)
                  else:
                          thirteenth_feature = 0
                  all_features.append(thirteenth_feature)
@@ -790,189 +837,15 @@ class Stroke(object):
 
         ## context shape features from Ling's thesis
         def context_shape_features(self, other):
-                context_shape = [[0 for x in xrange(5)] for x in xrange(12)]
-                self_center = self.center
-                self_diag = 2.0*self.half_diag
-                point_number = 0 ## point number is the number of points in the context of the reference point
-                total_number = len(self.points) + len(other.points)
-
-                ##for the points in the current stroke
-                for x in self.points:
-                        temp_distance = distance(x,self_center)
-                        if temp_distance <= self_diag:
-                                point_number += 1
-                                v1 = (x[0] - self_center[0], x[1] - self_center[1])
-                                v2 = (1,0)## horizontal line
-                                temp_angle = angle(v1,v2) ## the angle is in radian
-                                if self_diag == 0:
-                                        distance_ratio = 0
-                                else:
-                                        distance_ratio = temp_distance/self_diag
-                                if distance_ratio<=1.0/16:
-                                        col_index = 0
-                                elif 1.0/16<distance_ratio<=1.0/8:
-                                        col_index = 1
-                                elif 1.0/8<distance_ratio<=1.0/4:
-                                        col_index = 2
-                                elif 1.0/4<distance_ratio<=1.0/2:
-                                        col_index = 3
-                                else:
-                                        col_index = 4
-                                        
-                                ## the polor coordinated is divided into 12 parts based on the angle, each part contain pi/6, and math.atan(1) is pi/4
-                                angle_ratio = 1.5*(temp_angle/math.atan(1))
-
-                                if v1[1]>=0:
-                                        row_index = math.floor(angle_ratio)
-                                else:
-                                        row_index = 11 - math.floor(angle_ratio)
-
-                                context_shape[int(row_index)][int(col_index)]+=1
-
-                ##for the points in the next stroke
-                for x in other.points:
-                        temp_distance = distance(x,self_center)
-                        if temp_distance <= self_diag:
-                                point_number += 1
-                                v1 = (x[0] - self_center[0], x[1] - self_center[1])
-                                v2 = (1,0)## horizontal line
-                                temp_angle = angle(v1,v2) ## the angle is in radian
-                                if self_diag == 0:
-                                        distance_ratio = 0
-                                else:
-                                        distance_ratio = temp_distance/self_diag
-                                if distance_ratio<=1.0/16:
-                                        col_index = 0
-                                elif 1.0/16<distance_ratio<=1.0/8:
-                                        col_index = 1
-                                elif 1.0/8<distance_ratio<=1.0/4:
-                                        col_index = 2
-                                elif 1.0/4<distance_ratio<=1.0/2:
-                                        col_index = 3
-                                else:
-                                        col_index = 4
-                                        
-                                ## the polor coordinated is divided into 12 parts based on the angle, each part contain pi/6, and math.atan(1) is pi/4
-                                angle_ratio = 1.5*(temp_angle/math.atan(1))
-
-                                if v1[1]>=0:
-                                        row_index = math.floor(angle_ratio)
-                                else:
-                                        row_index = 11 - math.floor(angle_ratio)
-
-                                context_shape[int(row_index)][int(col_index)]+=1
-
-                final_context_shape = []
-                for i in range(12):
-                        for j in range(5):
-                                final_context_shape.append(context_shape[i][j]/float(point_number))
-
-                ## delete the NaN element in the feature vector
-                for i in range(len(final_context_shape)):
-                         if math.isnan(final_context_shape[i]):
-                                 final_context_shape[i] = 0
-                return final_context_shape
+                points = shape_context.stroke_points([self, other])
+                return shape_context.shape_context(points, self.center, 2.0*self.half_diag)[0].tolist()
 
 
         ## context shape features from Ling's thesis, but the length of radius is flexible to make the circle can
         ## cover but only can cover the two strokes in the stroke pair 
         def context_shape_features_1NN(self, other):
-                context_shape = [[0 for x in xrange(5)] for x in xrange(12)]
-                self_center = self.center
-                self_diag = 0.0
-                point_number = 0 ## point number is the number of points in the context of the reference point
-                total_number = len(self.points) + len(other.points)
-
-
-                for x in self.points:
-                        temp_distance = distance(x,self_center)
-                        if temp_distance > self_diag:
-                                self_diag = temp_distance
-
-
-                for x in other.points:
-                        temp_distance = distance(x,self_center)
-                        if temp_distance > self_diag:
-                                self_diag = temp_distance
-
-                ##for the points in the current stroke
-                for x in self.points:
-                        temp_distance = distance(x,self_center)
-                        if temp_distance <= self_diag:
-                                point_number += 1
-                                v1 = (x[0] - self_center[0], x[1] - self_center[1])
-                                v2 = (1,0)## horizontal line
-                                temp_angle = angle(v1,v2) ## the angle is in radian
-                                if self_diag == 0:
-                                        distance_ratio = 0
-                                else:
-                                        distance_ratio = temp_distance/self_diag
-                                if distance_ratio<=1.0/16:
-                                        col_index = 0
-                                elif 1.0/16<distance_ratio<=1.0/8:
-                                        col_index = 1
-                                elif 1.0/8<distance_ratio<=1.0/4:
-                                        col_index = 2
-                                elif 1.0/4<distance_ratio<=1.0/2:
-                                        col_index = 3
-                                else:
-                                        col_index = 4
-                                        
-                                ## the polor coordinated is divided into 12 parts based on the angle, each part contain pi/6, and math.atan(1) is pi/4
-                                angle_ratio = 1.5*(temp_angle/math.atan(1))
-
-                                if v1[1]>=0:
-                                        row_index = math.floor(angle_ratio)
-                                else:
-                                        row_index = 11 - math.floor(angle_ratio)
-
-                                context_shape[int(row_index)][int(col_index)]+=1
-
-
-                ##for the points in the next stroke
-                for x in other.points:
-                        temp_distance = distance(x,self_center)
-                        if temp_distance <= self_diag:
-                                point_number += 1
-                                v1 = (x[0] - self_center[0], x[1] - self_center[1])
-                                v2 = (1,0)## horizontal line
-                                temp_angle = angle(v1,v2) ## the angle is in radian
-                                if self_diag == 0:
-                                        distance_ratio = 0
-                                else:
-                                        distance_ratio = temp_distance/self_diag
-                                if distance_ratio<=1.0/16:
-                                        col_index = 0
-                                elif 1.0/16<distance_ratio<=1.0/8:
-                                        col_index = 1
-                                elif 1.0/8<distance_ratio<=1.0/4:
-                                        col_index = 2
-                                elif 1.0/4<distance_ratio<=1.0/2:
-                                        col_index = 3
-                                else:
-                                        col_index = 4
-                                        
-                                ## the polor coordinated is divided into 12 parts based on the angle, each part contain pi/6, and math.atan(1) is pi/4
-                                angle_ratio = 1.5*(temp_angle/math.atan(1))
-
-                                if v1[1]>=0:
-                                        row_index = math.floor(angle_ratio)
-                                else:
-                                        row_index = 11 - math.floor(angle_ratio)
-
-                                context_shape[int(row_index)][int(col_index)]+=1
-
-                final_context_shape = []
-                for i in range(12):
-                        for j in range(5):
-                                final_context_shape.append(context_shape[i][j]/float(point_number))
-
-                ## delete the NaN element in the feature vector
-
-                for i in range(len(final_context_shape)):
-                         if math.isnan(final_context_shape[i]):
-                                 final_context_shape[i] = 0
-                return final_context_shape                
+                points = shape_context.stroke_points([self, other])
+                return shape_context.shape_context(points, self.center)[0].tolist()
                 
                                        
         def bb_intersects(self, other):
@@ -980,19 +853,9 @@ class Stroke(object):
                 o_mins, o_maxs = other.extents
                 return (mins[0] <= o_maxs[0]) and (maxs[0] >= o_mins[0]) and (mins[1] <= o_maxs[1]) and (maxs[1] >= o_mins[1])
                 
+        ## whether two segments of the strokes share an end point or cross
         def intersects(self, other):
-                for s1, s2 in zip(self.points, self.points[1:]):
-                        for o1, o2 in zip(other.points, other.points[1:]):
-                                if s1 == o1 or s1 == o2 or s2 == o1 or s2 == o2:
-                                        return True
-                                v1 = np.cross(vect(s1, o1), vect(s1, s2))
-                                v2 = np.cross(vect(s1, o2), vect(s1, s2))
-                                if v1[2] * v2[2] < 0:
-                                        w1 = np.cross(vect(o1, s1), vect(o1, o2))
-                                        w2 = np.cross(vect(o1, s2), vect(o1, o2))
-                                        if w1[2] * w2[2] < 0:
-                                                return True
-                return False
+                return stroke_collision.polylines_intersect(self.array, other.array)
 
 ## dot product
 def dotproduct(v1,v2):
@@ -1125,11 +988,15 @@ class symbol_candidate(object):
                 box = zipwith(lambda x,y: abs(x - y), mins, maxs)
                 return zipwith(lambda m,b: m + (float(b) / 2), mins, box)
 
-        def closest_distance(self, other):
+        ## the stroke distances come from distance_cache if it is given
+        def closest_distance(self, other, distance_cache = None):
                 closest_dis = 1000000
                 for i in range(len(self.stroke_list)):
                         for j in range(len(other.stroke_list)):
-                                temp_closest_dis = self.stroke_list[i].closest_distance(other.stroke_list[j])
+                                if distance_cache is None:
+                                        temp_closest_dis = self.stroke_list[i].closest_distance(other.stroke_list[j])
+                                else:
+                                        temp_closest_dis = distance_cache.closest_distance(self.stroke_list[i], other.stroke_list[j])
                                 if temp_closest_dis < closest_dis:
                                         closest_dis = temp_closest_dis
                 return closest_dis
@@ -1142,212 +1009,210 @@ def ensure_dir(f):
 
 
 ## the entrance program for CROHME 2013
-def DPRL_CROHME2013(path, output_path):
+## options: --jobs N to recognize the files with N processes
+def DPRL_CROHME2013(path, output_path, *options):
+        jobs = 1
+        options = list(options)
+        while len(options) > 0:
+                option = options.pop(0)
+                if option == '--jobs' and len(options) > 0:
+                        jobs = int(options.pop(0))
+                else:
+                        raise Exception("Unknown option: " + option)
 
         ensure_dir(output_path)
-        cur_dir = os.getcwd()
-        CROHMELib_dir = os.path.join(cur_dir, 'crohmelib/bin/')
-        os.chdir(CROHMELib_dir)
         ##convert the format of inkml files
-        subprocess.call(['./normalizeSymbols', path])
-        os.chdir(cur_dir)
-
-        files = [f for f in os.listdir(path) if os.path.splitext(f)[1] == '.inkml']
-        ## deal with the input inkml file one by one
-        for i, filename in enumerate(files):
-                print('%s (%d/%d)' % (filename, i + 1, len(files)))
-                ## read the inkml file
-                eq = Equation.from_inkml(os.path.join(path, filename))
-                O_eq = copy.deepcopy(eq)
-                
-                ## get segmentation results
-                eq.lei_CROHME2013_segment()
-                
-                ## get classification results
-                symbol_candidate_list = []       
-                for seg in eq.segments:
-                        stroke_list = []
-                        points = []
-                        for stro in seg.strokes:
-                                ## the original stroke data
-                                stroke_list.append(O_eq.strokes[stro])
-                                points = points + O_eq.strokes[stro].points
-
-                        trace_list = []
-                        for j in range(len(stroke_list)):
-                                one_trace = (stroke_list[j].id, stroke_list[j].points)
-                                trace_list.append(one_trace)
-
-                        ## do the classification for a given symbol candidate
-                        symbol_label = KENNY_CLASSIFIER.mostProbableLabel(KENNY_CLASSIFIER.classify(copy.deepcopy(trace_list)))[0]
-                        ## get the top N classification result based on the classification confidence
-                        top_N_num = 3
-                        top_three = KENNY_CLASSIFIER.topNLabels(KENNY_CLASSIFIER.classify(copy.deepcopy(trace_list)), top_N_num)
-
-                        ## deal with several special symbols to make the lable for them to be consistent
-                        if symbol_label == '\\cdot':
-                                symbol_label = '.'
-                        if symbol_label == '\\tg':
-                                symbol_label = '\\tan'
-
-                        for j in range(top_N_num):
-                                if top_three[j][0] == '\\cdot':
-                                        top_three[j] = tuple(['.', top_three[j][1]])
-                                if top_three[j][0] == '\\tg':
-                                        top_three[j] = tuple(['\\tan', top_three[j][1]])
-
-                        ## get one symbol candidate with its top 3 classification results and confidence
-                        one_symbol_candidate = symbol_candidate(symbol_label, stroke_list, points, top_three)
-                        symbol_candidate_list.append(one_symbol_candidate)
-
-                ##parsing
-                relation_tree = CROHME2013_parsing_MST(symbol_candidate_list)
-
-                ## get the LG file
-                write_LG(filename, symbol_candidate_list, relation_tree)   
-                LG_name = os.path.join(cur_dir, filename[:len(filename)-6] + '.lg')
-                INKML_name = os.path.join(path, filename)
-                shutil.copyfile(INKML_name, os.path.join(CROHMELib_dir, filename))
-                shutil.copyfile(LG_name, os.path.join(CROHMELib_dir, filename[:len(filename)-6] + '.lg'))
-                os.remove(LG_name)
-                os.chdir(CROHMELib_dir)
-                one_LG_name = filename[:len(filename)-6] + '.lg'
-                subprocess.call(['./mergeLgCrohme', one_LG_name, filename])
-                os.remove(one_LG_name)
-                os.remove(filename)
-                result_inkml_file = filename[:len(filename)-6] + '_out.inkml'
-                result_LG_file = filename[:len(filename)-6] + '_crohme.lg'
-                os.remove(result_inkml_file)
-                if os.path.exists(result_LG_file):
-                        shutil.copyfile(result_LG_file, os.path.join(output_path, result_LG_file))
-                        os.remove(result_LG_file)
-                        os.rename(os.path.join(output_path, result_LG_file), os.path.join(output_path, result_LG_file[:len(result_LG_file)-10] + '.lg'))
-       
-                os.chdir(cur_dir)
-
-
-
-##write the recognition result as a LG
-def write_LG(file_name, symbol_candidate_list, relation_tree):
-        dirname = os.getcwd()
-        new_file_name = file_name[:len(file_name)-6]
-        with open(os.path.join(dirname, new_file_name + '.lg'), 'w') as sfile:
-                sfile.write('# IUD, ' + new_file_name + '\n')
-                sfile.write('# Nodes:' + '\n')
-                ## write for the Ns
-                symbol_num = len(symbol_candidate_list)
-                for i in range(symbol_num):
-                        for j in range(len(symbol_candidate_list[i].stroke_list)):
-                                sfile.write('N, ')
-                                sfile.write('%d' % symbol_candidate_list[i].stroke_list[j].id)
-                                sfile.write(', ' + symbol_candidate_list[i].symbol_label + ', ')
-                                sfile.write('%f' % 1.0)
-                                sfile.write('\n')
-
-                ## write for the Es
-                sfile.write('\n')
-                sfile.write('# Edges:' + '\n')
-
-                ## write for the Es with relationship with '*'
-                for i in range(symbol_num):
-                        stroke_num = len(symbol_candidate_list[i].stroke_list)
-                        if stroke_num > 1:
-                                stroke_id_list = []
-                                for j in range(stroke_num):
-                                        stroke_id_list.append(symbol_candidate_list[i].stroke_list[j].id)
-
-                                for j in range(stroke_num):
-                                        for k in range(stroke_num):
-                                                if j!=k:
-                                                        stroke_id_1 = stroke_id_list[j]
-                                                        stroke_id_2 = stroke_id_list[k]
-                                                        sfile.write('E, ')
-                                                        sfile.write('%d' % stroke_id_1)
-                                                        sfile.write(', ')
-                                                        sfile.write('%d' % stroke_id_2)
-                                                        sfile.write(', ')
-                                                        sfile.write('*' + ', ')
-                                                        sfile.write('%f' % 1.0)
-                                                        sfile.write('\n')
-                                        
-                        else:
-                                continue
-                        
-
-                ## write for the Es with relationship but '*'
-                edge_num = len(relation_tree)
-                for i in range(edge_num):
-                        one_edge = relation_tree[i]
-                        if one_edge[2] == 'Same':
-                                continue
-                        else:
-                                PC_R = one_edge[2] ## parent child relation
-                                symbol_list_1 = one_edge[0]
-                                symbol_list_2 = one_edge[1]
-                                for j in range(len(symbol_list_1)):
-                                        parent_symbol = symbol_list_1[j]
-                                        for k in range(len(symbol_list_2)):
-                                                child_symbol = symbol_list_2[k]
-                                                for l in range(len(parent_symbol.stroke_list)):
-                                                        S1 = parent_symbol.stroke_list[l]
-                                                        for m in range(len(child_symbol.stroke_list)):
-                                                                S2 = child_symbol.stroke_list[m]
-                                                                sfile.write('E, ')
-                                                                sfile.write('%d' % S1.id)
-                                                                sfile.write(', ')
-                                                                sfile.write('%d' % S2.id)
-                                                                sfile.write(', ')
-##                                                                print "PC_R", PC_R
-                                                                sfile.write(PC_R + ', ')
-                                                                sfile.write('%f' % 1.0)
-                                                                sfile.write('\n')
-                                                
-                                
-                        
-
+        subprocess.call([os.path.join(CROHMELIB_DIR, 'normalizeSymbols'), path])
 
-## write symbols for paco for spatial relationship classification
-def write_Paco_symbol(one_symbol, n):
-        dirname = os.getcwd()
-        with open(os.path.join(dirname, 'sym' + str(n)), 'w') as sfile:
-                sfile.write(one_symbol.symbol_label + '\n')
-                sfile.write('%d \n' % len(one_symbol.stroke_list))
-                for i in range(len(one_symbol.stroke_list)):
-                        sfile.write('%d \n' % len(one_symbol.stroke_list[i].points))
-                        for p in one_symbol.stroke_list[i].points:
-                                sfile.write('%f %f\n' % p)
+        ## load the models before the workers are started, so that they are shared with them
+        load_recognition_models()
 
+        files = [f for f in os.listdir(path) if os.path.splitext(f)[1] == '.inkml']
+        worker_args = (path, output_path)
+        start_time = time.time()
+        total_strokes = 0
+        failed = []
+
+        if jobs > 1:
+                pool = multiprocessing.Pool(jobs, init_DPRL_worker, worker_args)
+                results = pool.imap_unordered(DPRL_CROHME2013_worker_file, files)
+        else:
+                pool = None
+                init_DPRL_worker(*worker_args)
+                results = itertools.imap(DPRL_CROHME2013_worker_file, files)
+
+        ## deal with the input inkml files as they are finished
+        for i, (filename, stats, error) in enumerate(results):
+                if error is None:
+                        total_strokes += stats.stroke_num
+                        print('%s (%d/%d)' % (filename, i + 1, len(files)))
+                        print('\tspatial relationships: %d evaluated, %d from the cache (%d with other labels of the same type)' % stats.relation_counts)
+                        print('\tstroke distances: %d computed, %d from the cache' % stats.distance_counts)
+                        print('\tsymbol hypotheses: %d classified, %d from the cache' % stats.symbol_counts)
+                        print('\tstroke traces: %d preprocessed, %d from the cache' % stats.trace_counts)
+                else:
+                        failed.append(filename)
+                        print('%s (%d/%d) FAILED: %s' % (filename, i + 1, len(files), error))
+                sys.stdout.flush()
+
+        if pool is not None:
+                pool.close()
+                pool.join()
+
+        ## throughput report
+        elapsed = time.time() - start_time
+        print('%d files (%d failed), %d strokes in %.1f s with %d process(es): %.2f files/s, %.1f strokes/s' % (
+                len(files), len(failed), total_strokes, elapsed, jobs, len(files) / max(elapsed, 1e-9), total_strokes / max(elapsed, 1e-9)))
+        for filename in failed:
+                print('failed: %s' % filename)
+
+
+## the models used to recognize expressions: the symbol classifier (classifier.Classifier), the
+## segmentation model (segmentation_model.SegmentationModel) and the spatial relationship classifier
+## (see spatial_relation.load_classifier)
+class recognition_models(object):
+        def __init__(self, symbol_classifier, seg_model, relation_classifier):
+                self.symbol_classifier = symbol_classifier
+                self.seg_model = seg_model
+                self.relation_classifier = relation_classifier
+
+
+## models already loaded by this process, keyed by their files
+_loaded_recognition_models = {}
+
+
+## get the models of the given files, loading them only the first time they are asked for
+def load_recognition_models(symbol_classifier_file = SYMBOL_CLASSIFIER_FILE,
+                            coeff_file = SEGMENTATION_COEFF_FILE, adaboost_file = SEGMENTATION_ADABOOST_FILE,
+                            relation_model_file = RELATION_MODEL_FILE, relation_pca_file = RELATION_PCA_FILE):
+        key = (symbol_classifier_file, coeff_file, adaboost_file, relation_model_file, relation_pca_file)
+        if key not in _loaded_recognition_models:
+                _loaded_recognition_models[key] = recognition_models(classifier.Classifier(symbol_classifier_file, None),
+                                                                     segmentation_model.load_segmentation_model(coeff_file, adaboost_file),
+                                                                     spatial_relation.load_classifier(relation_model_file, relation_pca_file))
+        return _loaded_recognition_models[key]
+
+
+## the counters of the recognition of one expression (see DPRL_CROHME2013_file): its number of
+## strokes and the counters of its caches, read from the equation, its relation cache
+## (spatial_relation.RelationCache) and its symbol cache (classifier.ClassificationCache)
+class recognition_stats(object):
+        def __init__(self, eq, relation_cache, symbol_cache):
+                self.stroke_num = len(eq.strokes)
+                ## evaluated, from the cache, from the cache with other labels of the same type
+                self.relation_counts = (relation_cache.misses, relation_cache.hits, relation_cache.shared)
+                ## computed, from the cache
+                distance_cache = eq.get_distance_cache()
+                self.distance_counts = (distance_cache.misses, distance_cache.hits)
+                ## classified, from the cache
+                self.symbol_counts = (symbol_cache.misses, symbol_cache.hits)
+                ## preprocessed, from the cache
+                self.trace_counts = (symbol_cache.trace_cache.misses, symbol_cache.trace_cache.hits)
+
+
+## the state of a process recognizing files, set by init_DPRL_worker
+_worker = {}
+
+
+## prepare a process to recognize files: the models are loaded once for all its files
+def init_DPRL_worker(path, output_path):
+        _worker['path'] = path
+        _worker['output_path'] = output_path
+        _worker['models'] = load_recognition_models()
+
+
+## recognize one file in a process prepared by init_DPRL_worker, an error only fails that file
+## returns the file name, the recognition_stats of DPRL_CROHME2013_file (None when it failed) and
+## the error (None when it succeeded)
+def DPRL_CROHME2013_worker_file(filename):
+        try:
+                return filename, DPRL_CROHME2013_file(filename, _worker['path'], _worker['output_path'], _worker['models']), None
+        except Exception as e:
+                return filename, None, '%s: %s' % (type(e).__name__, e)
+
+
+## recognize one inkml file of path and write its label graph with inherited relationships to
+## output_path, returns its recognition_stats
+def DPRL_CROHME2013_file(filename, path, output_path, models):
+        ## read the inkml file
+        eq = Equation.from_inkml(os.path.join(path, filename))
+        O_eq = copy.deepcopy(eq)
+        ## the confidences of the stroke groups, shared by the segmentation and the classification
+        symbol_cache = classifier.ClassificationCache(models.symbol_classifier, get_traces(O_eq))
+        
+        ## get segmentation results
+        eq.lei_CROHME2013_segment(models.seg_model, models.symbol_classifier, symbol_cache)
+        
+        ## get classification results
+        segment_strokes = []
+        stroke_groups = []
+        for seg in eq.segments:
+                ## the original stroke data
+                segment_strokes.append([O_eq.strokes[stro] for stro in seg.strokes])
+                stroke_groups.append(list(seg.strokes))
+
+        ## do the classification for all the symbol candidates at once, the groups already classified
+        ## for the segmentation come from the cache
+        confidences = symbol_cache.classify_groups(stroke_groups)
+        symbol_labels = models.symbol_classifier.mostProbableLabel_batch(confidences)
+        ## get the top N classification result based on the classification confidence
+        top_N_num = 3
+        top_N_labels = models.symbol_classifier.topNLabels_batch(confidences, top_N_num)
+
+        symbol_candidate_list = []       
+        for stroke_list, (symbol_label, confidence), top_three in zip(segment_strokes, symbol_labels, top_N_labels):
+                points = []
+                for stroke in stroke_list:
+                        points = points + stroke.points
+
+                ## deal with several special symbols to make the lable for them to be consistent
+                if symbol_label == '\\cdot':
+                        symbol_label = '.'
+                if symbol_label == '\\tg':
+                        symbol_label = '\\tan'
+
+                for j in range(top_N_num):
+                        if top_three[j][0] == '\\cdot':
+                                top_three[j] = tuple(['.', top_three[j][1]])
+                        if top_three[j][0] == '\\tg':
+                                top_three[j] = tuple(['\\tan', top_three[j][1]])
+
+                ## get one symbol candidate with its top 3 classification results and confidence
+                one_symbol_candidate = symbol_candidate(symbol_label, stroke_list, points, top_three)
+                symbol_candidate_list.append(one_symbol_candidate)
+
+        ##parsing
+        relation_cache = spatial_relation.RelationCache(models.relation_classifier)
+        relation_tree = CROHME2013_parsing_MST(symbol_candidate_list, relation_cache)
+
+        ## get the LG file with the inherited relationships
+        LG_name = os.path.join(output_path, filename[:len(filename)-6] + '.lg')
+        label_graph.write_inherited_LG(LG_name, label_graph.inkml_UI(eq.dom), symbol_candidate_list, relation_tree)
+
+        return recognition_stats(eq, relation_cache, symbol_cache)
 
 
 ## get Paco relationships for two symbols
-def get_Paco_R(sym_1,sym_2):
-        write_Paco_symbol(sym_1, 1)
-        write_Paco_symbol(sym_2, 2)
+def get_Paco_R(sym_1,sym_2,relation_cache):
+        R_score = relation_cache.classify(sym_1, sym_2)
 
-        Paco_string = subprocess.check_output(['./layout', 'sym1', 'sym2',  'MODhbp.svm',  'MAT.pca'])
-        space_location = find(Paco_string, ' ')
-        newline_location = find(Paco_string, '\n')
-        R_score = []
-
-        for i in range(3):
-                R_score.append(float(Paco_string[space_location[i]:newline_location[i]]))
-
-        R_list = ['Sub', 'R', 'Sup']
-        return R_list[R_score.index(max(R_score))]
+        return get_Paco_R_from_Score(R_score)[1]
 
 
 ## get Paco relationships for two symbols by using MST
-def get_Paco_R_MST(sym_1,sym_2):
+def get_Paco_R_MST(sym_1,sym_2,relation_cache):
         if sym_2.symbol_label == '-' or sym_2.symbol_label == '\\frac' or sym_2.symbol_label == '\\sum' or sym_2.symbol_label == '\\lim' or sym_2.symbol_label == '\\sqrt':
-                S_R = get_Paco_R(sym_1, sym_2)
+                S_R = get_Paco_R(sym_1, sym_2, relation_cache)
         else:
+                ## the relationship for every label of the top three of sym_2, requested together
+                all_R_score = relation_cache.classify_labels(sym_1, sym_2, [sym_2.top_three[i][0] for i in range(len(sym_2.top_three))])
+
                 classification_score = []
                 relation_score = []
                 s_relation = []
                 for i in range(len(sym_2.top_three)):
                         classification_score.append(sym_2.top_three[i][1])
-                        sym_2.symbol_label = sym_2.top_three[i][0]
-                        one_relation = get_Paco_R_Score(sym_1, sym_2)
+                        one_relation = get_Paco_R_from_Score(all_R_score[i])
                         relation_score.append(one_relation[0])
                         s_relation.append(one_relation[1])
 
@@ -1366,21 +1231,17 @@ def get_Paco_R_MST(sym_1,sym_2):
 
 
 ## get Paco relationships and scores for two symbols
-def get_Paco_R_Score(sym_1,sym_2):
-        write_Paco_symbol(sym_1, 1)
-        write_Paco_symbol(sym_2, 2)
+def get_Paco_R_Score(sym_1,sym_2,relation_cache):
+        R_score = relation_cache.classify(sym_1, sym_2)
 
-        Paco_string = subprocess.check_output(['./layout', 'sym1', 'sym2',  'MODhbp.svm',  'MAT.pca'])
-        space_location = find(Paco_string, ' ')
-        newline_location = find(Paco_string, '\n')
-        R_score = []
+        return get_Paco_R_from_Score(R_score)
 
-        for i in range(3):
-                R_score.append(float(Paco_string[space_location[i]:newline_location[i]]))
 
+## the most likely relationship and its score from the Sub, Hor and Sup probabilities
+def get_Paco_R_from_Score(R_score):
         R_list = ['Sub', 'R', 'Sup']
         return [max(R_score), R_list[R_score.index(max(R_score))]]
-        
+
 
 
 
@@ -1409,7 +1270,9 @@ def get_VOR(sym_1, sym_2):
         return VOR
         
 
-def CROHME2013_parsing_MST(symbol_candidate_list):
+## relation_cache (spatial_relation.RelationCache) classifies the spatial relationships and keeps
+## them for the expression, it is shared with the recursive calls for the sub-expressions
+def CROHME2013_parsing_MST(symbol_candidate_list, relation_cache):
         relation_tree = []
         symbol_num = len(symbol_candidate_list)
         left_side = []
@@ -1490,7 +1353,7 @@ def CROHME2013_parsing_MST(symbol_candidate_list):
                         if reference_index+1< baseline_symbol_num:## the reference symbol is not the rightmost symbol
                                         right_sym_found = 0
                                         for i in range(reference_index+1 ,baseline_symbol_num):
-                                                temp_R = get_Paco_R_MST(reference_sym, baseline_symbol[baseline_sorted_index[i]])
+                                                temp_R = get_Paco_R_MST(reference_sym, baseline_symbol[baseline_sorted_index[i]], relation_cache)
                                                 if temp_R == 'R':## the right symbol is found
                                                         right_sym_found = 1
                                                         one_edge = [[reference_sym], [baseline_symbol[baseline_sorted_index[i]]], temp_R]
@@ -1499,14 +1362,14 @@ def CROHME2013_parsing_MST(symbol_candidate_list):
                                                         if sym_gap > 1: ## means there are symbols between in the two adjacent symbols
                                                                 for j in range(reference_index, i-1):
                                                                         ## add the edge based on the score
-                                                                        relation_1 = get_Paco_R_Score(reference_sym, baseline_symbol[baseline_sorted_index[j+1]])# relation_1 is [score, R]
-                                                                        relation_2 = get_Paco_R_Score(baseline_symbol[baseline_sorted_index[j]], baseline_symbol[baseline_sorted_index[j+1]])
+                                                                        relation_1 = get_Paco_R_Score(reference_sym, baseline_symbol[baseline_sorted_index[j+1]], relation_cache)# relation_1 is [score, R]
+                                                                        relation_2 = get_Paco_R_Score(baseline_symbol[baseline_sorted_index[j]], baseline_symbol[baseline_sorted_index[j+1]], relation_cache)
                                                                         if relation_1[0] >= relation_2[0]:
-                                                                                temp_R = get_Paco_R_MST(reference_sym, baseline_symbol[baseline_sorted_index[j+1]])
+                                                                                temp_R = get_Paco_R_MST(reference_sym, baseline_symbol[baseline_sorted_index[j+1]], relation_cache)
                                                                                 one_edge = [[reference_sym], [baseline_symbol[baseline_sorted_index[j+1]]], temp_R]
                                                                                 relation_tree.append(one_edge)
                                                                         else:
-                                                                                temp_R = get_Paco_R_MST(baseline_symbol[baseline_sorted_index[j]], baseline_symbol[baseline_sorted_index[j+1]])
+                                                                                temp_R = get_Paco_R_MST(baseline_symbol[baseline_sorted_index[j]], baseline_symbol[baseline_sorted_index[j+1]], relation_cache)
                                                                                 one_edge = [[baseline_symbol[baseline_sorted_index[j]]], [baseline_symbol[baseline_sorted_index[j+1]]], temp_R]
                                                                                 relation_tree.append(one_edge)
                     
@@ -1518,15 +1381,15 @@ def CROHME2013_parsing_MST(symbol_candidate_list):
                                                 to_find_right_sym =0
                                                 for j in range(reference_index, baseline_symbol_num-1):
                                                         ## add the edge based on the score
-                                                        relation_1 = get_Paco_R_Score(reference_sym, baseline_symbol[baseline_sorted_index[j+1]])# relation_1 is [score, R]
-                                                        relation_2 = get_Paco_R_Score(baseline_symbol[baseline_sorted_index[j]], baseline_symbol[baseline_sorted_index[j+1]])
+                                                        relation_1 = get_Paco_R_Score(reference_sym, baseline_symbol[baseline_sorted_index[j+1]], relation_cache)# relation_1 is [score, R]
+                                                        relation_2 = get_Paco_R_Score(baseline_symbol[baseline_sorted_index[j]], baseline_symbol[baseline_sorted_index[j+1]], relation_cache)
                                                         if relation_1[0] >= relation_2[0]:
-                                                                temp_R = get_Paco_R_MST(reference_sym, baseline_symbol[baseline_sorted_index[j+1]])
+                                                                temp_R = get_Paco_R_MST(reference_sym, baseline_symbol[baseline_sorted_index[j+1]], relation_cache)
                                                                 one_edge = [[reference_sym], [baseline_symbol[baseline_sorted_index[j+1]]], temp_R]
                                                                 relation_tree.append(one_edge)
   
                                                         else:
-                                                                temp_R = get_Paco_R_MST(baseline_symbol[baseline_sorted_index[j]], baseline_symbol[baseline_sorted_index[j+1]])
+                                                                temp_R = get_Paco_R_MST(baseline_symbol[baseline_sorted_index[j]], baseline_symbol[baseline_sorted_index[j+1]], relation_cache)
                                                                 one_edge = [[baseline_symbol[baseline_sorted_index[j]]], [baseline_symbol[baseline_sorted_index[j+1]]], temp_R]
                                                                 relation_tree.append(one_edge)
                                     
@@ -1544,7 +1407,7 @@ def CROHME2013_parsing_MST(symbol_candidate_list):
                         one_edge = [[sub_expression_list[i].dominant_symbol], sub_expression_list[i].symbol_list, sub_expression_list[i].spatial_r]
                         relation_tree.append(one_edge)
                         ## parsing recursively
-                        sub_relation_tree = CROHME2013_parsing_MST(sub_expression_list[i].symbol_list)
+                        sub_relation_tree = CROHME2013_parsing_MST(sub_expression_list[i].symbol_list, relation_cache)
                         relation_tree = relation_tree + sub_relation_tree
 
         return relation_tree
@@ -1578,13 +1441,14 @@ def is_inside(dominant_symbol, child_symbol):
         else:
                 return 0
 
-def get_MST(symbol_candidate_list):
+## distance_cache is the stroke distance cache of the equation of the symbol candidates
+def get_MST(symbol_candidate_list, distance_cache = None):
         symbol_num = len(symbol_candidate_list)
         symbol_dis = [[0.0 for x in xrange(int(symbol_num))] for x in xrange(int(symbol_num))]
         for i in range(symbol_num):
                 for j in range(symbol_num):
                         if j > i:
-                                symbol_dis[i][j] =  symbol_candidate_list[i].closest_distance(symbol_candidate_list[j])
+                                symbol_dis[i][j] =  symbol_candidate_list[i].closest_distance(symbol_candidate_list[j], distance_cache)
 
         symbol_dis_matrix = csr_matrix(symbol_dis)
         Tcsr = minimum_spanning_tree(symbol_dis_matrix)
@@ -1592,35 +1456,39 @@ def get_MST(symbol_candidate_list):
         return MST
 
 
-def get_two_CC(O_current_stroke, O_next_stroke):
-
-        id_1 = O_current_stroke.id
-        id_2 = O_next_stroke.id
-        points_1 = O_current_stroke.points
-        points_2 = O_next_stroke.points
-        trace_1 = (id_1, points_1)
-        trace_2 = (id_2, points_2)
-        symbol_1 = [trace_1]
-        symbol_2 = [trace_1, trace_2]
-        CC_1 = KENNY_CLASSIFIER.classify(copy.deepcopy(symbol_1))
-        CC_2 = KENNY_CLASSIFIER.classify(copy.deepcopy(symbol_2))
-        two_CC = CC_1 + CC_2
-        return two_CC
+def get_two_CC(O_current_stroke, O_next_stroke, symbol_classifier):
+        traces = {O_current_stroke.id: O_current_stroke.points, O_next_stroke.id: O_next_stroke.points}
+        symbol_cache = classifier.ClassificationCache(symbol_classifier, traces)
+        return get_two_CCs([(O_current_stroke.id, O_next_stroke.id)], symbol_cache)[0]
+
+
+## the classification scores of the first stroke alone and of the two strokes together, for all
+## the pairs of stroke ids, the groups not in symbol_cache are classified together
+def get_two_CCs(stroke_id_pairs, symbol_cache):
+        stroke_groups = []
+        for id_1, id_2 in stroke_id_pairs:
+                stroke_groups.append([id_1])
+                stroke_groups.append([id_1, id_2])
+        CC = symbol_cache.classify_groups(stroke_groups).tolist()
+        return [CC[2*i] + CC[2*i + 1] for i in range(len(stroke_id_pairs))]
+
+
+## the points of the strokes of an equation by stroke id, as the symbol classifier takes them
+def get_traces(eq):
+        return dict((stroke_id, stroke.points) for stroke_id, stroke in eq.strokes.items())
         
 
 ## preprocess equation, delete the repeated points, normalizing, smoothing and resampling
+## all the strokes are preprocessed at once on their packed points, with the same results as
+## equation_normalizing, delete_duplicate_point, smoothing, resampling and delete_duplicate_point
+## one stroke at a time
 def equation_preprocessing(raw_equation):
-        ## normalizing the equation
-        normalize_eq = equation_normalizing(raw_equation)
-        
-        temp_eq = normalize_eq
-        for i in range(len(temp_eq.strokes)):
-                current_stroke = temp_eq.strokes[i]
-                clean_stroke = delete_duplicate_point(current_stroke)
-                smooth_stroke = smoothing(clean_stroke)
-                resample_stroke = resampling(smooth_stroke)
-                second_clean_stroke = delete_duplicate_point(resample_stroke)
-                temp_eq.strokes[i] = second_clean_stroke
+        temp_eq = raw_equation
+        stroke_list = [temp_eq.strokes[i] for i in range(len(temp_eq.strokes))]
+        points, offsets = preprocessing.pack_strokes(stroke_list)
+        points, offsets = preprocessing.preprocess(points, offsets)
+        for i in range(len(stroke_list)):
+                temp_eq.strokes[i] = Stroke(stroke_list[i].id, points[offsets[i]:offsets[i + 1]])
 
         return temp_eq
 
@@ -1652,15 +1520,11 @@ def equation_normalizing(raw_equation):
         ## get the new points after normaliztion
         for i in range(len(normalize_eq.strokes)):
                 current_stroke = normalize_eq.strokes[i]
-                points = current_stroke.points
-                points = np.array(points)
+                points = current_stroke.array.copy()
                 points[:,0] = points[:,0] - min_x
                 points[:,1] = points[:,1] - min_y
                 normalize_points = points*normalize_ratio
-                final_points = []
-                for j in range(len(normalize_points)):
-                        final_points.append(tuple(normalize_points[j,:]))
-                normalize_eq.strokes[i] = Stroke(normalize_eq.strokes[i].id,final_points)
+                normalize_eq.strokes[i] = Stroke(normalize_eq.strokes[i].id,normalize_points)
 
         return normalize_eq
                 
@@ -1740,88 +1604,20 @@ def resampling(smooth_stroke):
 ## current_stroke is the reference stroke
 ## the radius will be flexible to can but only can can its 3 nearest neighbor
 def get_3NN_background_scf(eq, current_stroke):
-        context_shape = [[0 for x in xrange(5)] for x in xrange(12)]
-        self_center = current_stroke.center ## reference_center
-        self_diag = 0 ## reference_diag
-        point_number = 0
-        total_number = 0
         neighbor_num = 4# include the current stroke itself
 
         ## find the 3NN, plus the current stroke, it will be 4 strokes
         NN_id = []
         if len(eq.strokes)>neighbor_num:
-                Nearest_Dis = []
-                for i in range(len(eq.strokes)):
-                        one_stroke = eq.strokes[i]
-                        one_Nearest_Dis = current_stroke.closest_distance(one_stroke)
-                        Nearest_Dis.append(one_Nearest_Dis)
-                s = Nearest_Dis
-                sorted_index = sorted(range(len(s)), key = lambda k:s[k])
-                NN_id = sorted_index[:neighbor_num]
+                nearest = eq.get_stroke_index().nearest_strokes(current_stroke, neighbor_num)
+                NN_id = [id for dis, id in nearest]
         else:
                 ## if the stroke number is less than 5, then it will include all the strokes
                 NN_id = range(len(eq.strokes))
 
-        ## find the self_diag
-        temp_self_diag = 0.0
-        for i in range(len(NN_id)):
-                one_stroke = eq.strokes[NN_id[i]]
-                for x in one_stroke.points:
-                        temp_distance = distance(x,self_center)
-                        if temp_distance > temp_self_diag:
-                                temp_self_diag = temp_distance
-
-        self_diag = temp_self_diag
-                
-        ## calculate the feature 
-        for j in range(len(NN_id)):
-                now_stroke = eq.strokes[NN_id[j]]
-                total_number += len(now_stroke.points)
-                for x in now_stroke.points:
-                        temp_distance = distance(x,self_center)
-                        if temp_distance <= self_diag:
-                                point_number += 1
-                                v1 = (x[0] - self_center[0], x[1] - self_center[1])
-                                v2 = (1,0)## horizontal line
-                                temp_angle = angle(v1,v2) ## the angle is in radian
-                                if self_diag == 0:
-                                        distance_ratio = 0
-                                else:
-                                        distance_ratio = temp_distance/self_diag
-                                if distance_ratio<=1.0/16:
-                                        col_index = 0
-                                elif 1.0/16<distance_ratio<=1.0/8:
-                                        col_index = 1
-                                elif 1.0/8<distance_ratio<=1.0/4:
-                                        col_index = 2
-                                elif 1.0/4<distance_ratio<=1.0/2:
-                                        col_index = 3
-                                else:
-                                        col_index = 4
-                                        
-                                ## the polor coordinated is divided into 12 parts based on the angle, each part contain pi/6, and math.atan(1) is pi/4
-                                angle_ratio = 1.5*(temp_angle/math.atan(1))
-
-                                if v1[1]>=0:
-                                        row_index = math.floor(angle_ratio)
-                                else:
-                                        row_index = 11 - math.floor(angle_ratio)
-
-                                context_shape[int(row_index)][int(col_index)]+=1
-
-        final_context_shape = []
-        for i in range(12):
-                for j in range(5):
-                        if point_number > 0:
-                                final_context_shape.append(context_shape[i][j]/float(point_number))
-                        else:
-                                final_context_shape.append(0)
-
-        ## delete the NaN element in the feature vector
-        for i in range(len(final_context_shape)):
-                 if math.isnan(final_context_shape[i]):
-                         final_context_shape[i] = 0
-        return final_context_shape     
+        ## the radius will be the one of the circle which can cover all the points of the 4 strokes
+        points = shape_context.stroke_points([eq.strokes[i] for i in NN_id])
+        return shape_context.shape_context(points, current_stroke.center)[0].tolist()
 
                 
 
@@ -1829,73 +1625,15 @@ def get_3NN_background_scf(eq, current_stroke):
 ## get the global shape context feature
 ## current_stroke is the reference stroke
 def get_global_scf(eq, current_stroke):
-        context_shape = [[0 for x in xrange(5)] for x in xrange(12)]
-        self_center = current_stroke.center ## reference_center
-        self_diag = 0.0 ## reference_diag
-        point_number = 0
-        total_number = 0
-
-        ## get the radius of the circle which can cover the whole expression
-        for j in range(len(eq.strokes)):
-                now_stroke = eq.strokes[j]
-                for x in now_stroke.points:
-                        temp_distance = distance(x,self_center)
-                        if temp_distance > self_diag:
-                                self_diag = temp_distance
-                   
-        for j in range(len(eq.strokes)):
-                now_stroke = eq.strokes[j]
-                total_number += len(now_stroke.points)
-                for x in now_stroke.points:
-                        
-                        temp_distance = distance(x,self_center)
-                        if temp_distance <= self_diag:
-                                point_number += 1
-                                v1 = (x[0] - self_center[0], x[1] - self_center[1])
-                                v2 = (1,0)## horizontal line
-                                temp_angle = angle(v1,v2) ## the angle is in radian
-                                if self_diag == 0:
-                                        distance_ratio = 0
-                                else:
-                                        distance_ratio = temp_distance/self_diag
-                                if distance_ratio<=1.0/16:
-                                        col_index = 0
-                                elif 1.0/16<distance_ratio<=1.0/8:
-                                        col_index = 1
-                                elif 1.0/8<distance_ratio<=1.0/4:
-                                        col_index = 2
-                                elif 1.0/4<distance_ratio<=1.0/2:
-                                        col_index = 3
-                                else:
-                                        col_index = 4
-                                        
-                                ## the polor coordinated is divided into 12 parts based on the angle, each part contain pi/6, and math.atan(1) is pi/4
-                                angle_ratio = 1.5*(temp_angle/math.atan(1))
-
-                                if v1[1]>=0:
-                                        row_index = math.floor(angle_ratio)
-                                else:
-                                        row_index = 11 - math.floor(angle_ratio)
-
-                                context_shape[int(row_index)][int(col_index)]+=1
-
-        final_context_shape = []
-        for i in range(12):
-                for j in range(5):
-                        final_context_shape.append(context_shape[i][j]/float(point_number))
-
-        ## delete the NaN element in the feature vector
-
-        for i in range(len(final_context_shape)):
-                 if math.isnan(final_context_shape[i]):
-                         final_context_shape[i] = 0
-        return final_context_shape
-
+        return get_global_scfs(eq, [current_stroke])[0]
 
+## get the global shape context features of several reference strokes with one call of the kernel,
+## the radius of each one is the one of the circle which can cover the whole expression
+def get_global_scfs(eq, reference_strokes):
+        points = shape_context.stroke_points([eq.strokes[j] for j in range(len(eq.strokes))])
+        centers = [stroke.center for stroke in reference_strokes]
+        return shape_context.shape_context(points, centers).tolist()
 
-## find all indexes of a char in a string
-def find(s, ch):
-    return [i for i, ltr in enumerate(s) if ltr == ch]
 
                       
 if __name__ == '__main__':
@@ -1903,7 +1641,7 @@ if __name__ == '__main__':
                 usage_statement = [
                         'Usage: python segmentation.py <command>',
                         'where command is:',
-                        'DPRL_CROHME2013 <input_path> <output_path>'
+                        'DPRL_CROHME2013 <input_path> <output_path> [--jobs N]'
                         ]
                 sys.exit('\n\t'.join(usage_statement))
 
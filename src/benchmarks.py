@@ -0,0 +1,342 @@
+##    DPRL CROHME 2013
+##    Copyright (c) 2013-2014 Lei Hu, Kenny Davila, Francisco Alvaro, Richard Zanibbi
+##
+##    This file is part of DPRL CROHME 2013.
+##
+##    DPRL CROHME 2013 is free software:
+##    you can redistribute it and/or modify it under the terms of the GNU
+##    General Public License as published by the Free Software Foundation,
+##    either version 3 of the License, or (at your option) any later version.
+##
+##    DPRL CROHME 2013 is distributed in the hope that it will be useful,
+##    but WITHOUT ANY WARRANTY; without even the implied warranty of
+##    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##    GNU General Public License for more details.
+##
+##    You should have received a copy of the GNU General Public License
+##    along with DPRL CROHME 2013.
+##    If not, see <http://www.gnu.org/licenses/>.
+##
+##    Contact:
+##        - Lei Hu: lei.hu@rit.edu
+##        - Kenny Davila: kxd7282@rit.edu
+##        - Francisco Alvaro: falvaro@dsic.upv.es
+##        - Richard Zanibbi: rlaz@cs.rit.edu
+
+
+## Benchmarks of this tree against a baseline tree. A benchmark runs the same workload twice, in a
+## python process of its own for each tree, which imports the modules of that tree: the results of
+## the two runs must be the same, and the run time of each step and the peak memory are reported.
+##
+## The baseline tree is the src directory of another checkout of the repository, which has the
+## model files that its modules load when they are imported (tree_39.txt for DPRL), e.g.
+##     git worktree add ../baseline <commit>
+##     python benchmarks.py stroke ../baseline/src
+##
+## The workloads are made of the strokes of the toy expressions, copied side by side into one large
+## expression.
+
+import os
+import sys
+import time
+import pickle
+import resource
+import tempfile
+import threading
+import subprocess
+
+## the expressions the workloads are made of
+TOY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'toy')
+
+## the horizontal space between two expressions copied into the large expression
+EXPRESSION_GAP = 100.0
+
+## the seconds between two samples of the resident memory
+MEMORY_SAMPLE_INTERVAL = 0.001
+
+## the relative difference allowed between the floats of the results of the two trees
+FLOAT_TOLERANCE = 1e-9
+
+
+## the resident memory of this process, in MB
+def resident_memory():
+        with open('/proc/self/statm') as sfile:
+                return int(sfile.read().split()[1]) * resource.getpagesize() / float(1 << 20)
+
+
+## whether the results of the two trees are the same, with their floats compared up to
+## FLOAT_TOLERANCE
+def same_result(result, other):
+        if isinstance(result, float) or isinstance(other, float):
+                return abs(result - other) <= FLOAT_TOLERANCE * max(1.0, abs(result), abs(other))
+        if isinstance(result, dict) and isinstance(other, dict):
+                return sorted(result) == sorted(other) and all(same_result(result[key], other[key]) for key in result)
+        if isinstance(result, (list, tuple)) and isinstance(other, (list, tuple)):
+                return len(result) == len(other) and all(same_result(r, o) for r, o in zip(result, other))
+        return result == other
+
+
+## call function and return its result and its run time
+def timed(function, *args):
+        start = time.time()
+        result = function(*args)
+        return result, time.time() - start
+
+
+## call function and return its result, its run time and the peak of the resident memory while
+## it ran, which a thread samples
+def measured(function, *args):
+        samples = [resident_memory()]
+        done = threading.Event()
+
+        def sample():
+                while not done.wait(MEMORY_SAMPLE_INTERVAL):
+                        samples.append(resident_memory())
+
+        sampler = threading.Thread(target = sample)
+        sampler.start()
+        try:
+                result, seconds = timed(function, *args)
+        finally:
+                done.set()
+                sampler.join()
+        samples.append(resident_memory())
+        return result, seconds, max(samples)
+
+
+## the strokes of the toy expressions, copies times, side by side, as one expression with its
+## strokes numbered from 0
+def large_expression(DPRL, copies):
+        eq = DPRL.Equation()
+        offset = 0.0
+        for k in range(copies):
+                for filename in sorted(os.listdir(TOY_DIR)):
+                        if os.path.splitext(filename)[1] != '.inkml':
+                                continue
+                        toy_eq = DPRL.Equation.from_inkml(os.path.join(TOY_DIR, filename))
+                        stroke_ids = dict((toy_id, len(eq.strokes) + k) for k, toy_id in enumerate(sorted(toy_eq.strokes)))
+                        min_x = min(point[0] for stroke in toy_eq.strokes.values() for point in stroke.points)
+                        max_x = max(point[0] for stroke in toy_eq.strokes.values() for point in stroke.points)
+                        for toy_id, stroke_id in stroke_ids.items():
+                                eq.strokes[stroke_id] = DPRL.Stroke(stroke_id, [(x - min_x + offset, y) for x, y in toy_eq.strokes[toy_id].points])
+                        for segment in toy_eq.segments_truth:
+                                eq.segments_truth.add(DPRL.Segment([stroke_ids[toy_id] for toy_id in segment.strokes], segment.symbol))
+                        offset += max_x - min_x + EXPRESSION_GAP
+        eq.segments = DPRL.SegmentSet.init_unconnected_strokes(sorted(eq.strokes))
+        return eq
+
+
+## the segments of an expression as sorted lists of stroke ids
+def segment_strokes(segments):
+        return sorted(sorted(segment.strokes) for segment in segments)
+
+
+## the trace groups of the symbols of an expression, as the symbol classifier takes them, new
+## lists every time as the baseline preprocesses them in place
+def symbol_trace_groups(eq):
+        return [[(i, list(eq.strokes[i].points)) for i in stroke_ids] for stroke_ids in segment_strokes(eq.segments_truth)]
+
+
+## the workloads, each one takes the string arguments of the command line and returns its result,
+## which must be the same for both trees, and the run time of each of its steps
+
+
+## the strokes of a large expression: deepcopy, the geometry as the segmentation reads it, and
+## the distances and the segmentation features of the pairs of consecutive strokes
+def stroke_workload(copies = 10):
+        import copy
+        import DPRL
+        eq = large_expression(DPRL, int(copies))
+        strokes = [eq.strokes[i] for i in sorted(eq.strokes)]
+        pairs = zip(strokes, strokes[1:])
+
+        def geometry():
+                return [(s.extents, list(s.center), s.half_diag, s.width, s.height) for s in strokes]
+
+        def distances():
+                return [(s1.closest_distance(s2), s1.farest_distance(s2)) for s1, s2 in pairs]
+
+        def features():
+                return [s1.features(s2) for s1, s2 in pairs]
+
+        times = []
+        copied_eq, seconds = timed(copy.deepcopy, eq)
+        times.append(('deepcopy', seconds))
+        result = {}
+        for step, function in [('geometry', geometry), ('distances', distances), ('features', features)]:
+                result[step], seconds = timed(function)
+                times.append((step, seconds))
+        return result, times
+
+
+## the preprocessing of the strokes of a large expression
+def preprocessing_workload(copies = 10):
+        import DPRL
+        eq = large_expression(DPRL, int(copies))
+        eq, seconds = timed(DPRL.equation_preprocessing, eq)
+        return [eq.strokes[i].points for i in sorted(eq.strokes)], [('preprocessing', seconds)]
+
+
+## the merge of the touching strokes of a large expression
+def collision_workload(copies = 10):
+        import DPRL
+        eq = large_expression(DPRL, int(copies))
+        result, seconds = timed(eq.merge_touching)
+        return segment_strokes(eq.segments), [('merge touching', seconds)]
+
+
+## the background (3 nearest strokes) and the global shape contexts of every stroke of a large
+## preprocessed expression
+def nearest_workload(copies = 1):
+        import DPRL
+        eq = DPRL.equation_preprocessing(large_expression(DPRL, int(copies)))
+        strokes = [eq.strokes[i] for i in sorted(eq.strokes)]
+        result = {}
+        times = []
+        for step, function in [('background shape context', DPRL.get_3NN_background_scf), ('global shape context', DPRL.get_global_scf)]:
+                result[step], seconds = timed(lambda: [function(eq, stroke) for stroke in strokes])
+                times.append((step, seconds))
+        return result, times
+
+
+## the segmentation of a large expression, with the models the tree loads to segment it: the
+## baseline reads the segmentation model for every stroke pair and its symbol classifier when
+## DPRL is imported, later trees take both as arguments
+def segmentation_workload(copies = 1):
+        import inspect
+        import DPRL
+        eq = large_expression(DPRL, int(copies))
+        times = []
+        if len(inspect.getargspec(DPRL.Equation.lei_CROHME2013_segment).args) > 1:
+                import classifier
+                import segmentation_model
+                seg_model, seconds = timed(segmentation_model.load_segmentation_model, DPRL.SEGMENTATION_COEFF_FILE, DPRL.SEGMENTATION_ADABOOST_FILE)
+                symbol_classifier, classifier_seconds = timed(classifier.Classifier, DPRL.SYMBOL_CLASSIFIER_FILE, None)
+                models = (seg_model, symbol_classifier)
+                times.append(('models', seconds + classifier_seconds))
+        else:
+                models = ()
+                times.append(('models', 0.0))
+        result, seconds = timed(eq.lei_CROHME2013_segment, *models)
+        times.append(('segmentation', seconds))
+        return segment_strokes(eq.segments), times
+
+
+## the features of the symbols of a large expression: all of them, then the crossings and the
+## angular crossings alone
+def features_workload(copies = 4):
+        import classifier
+        import DPRL
+        symbol_classifier = classifier.Classifier('tree_39.txt', None)
+        eq = large_expression(DPRL, int(copies))
+        MathSymbol = classifier.MathSymbol
+        flags = [name for name in dir(MathSymbol) if name.startswith('use') and isinstance(getattr(MathSymbol, name), bool)]
+        enabled = [name for name in flags if getattr(MathSymbol, name)]
+
+        def features(trace_groups):
+                return [symbol_classifier.createSymbol(group).getFeatures() for group in trace_groups]
+
+        result = {}
+        times = []
+        for step, family in [('all features', None), ('crossings', 'useCrossings'), ('angular crossings', 'useAngularCrossings')]:
+                for name in flags:
+                        setattr(MathSymbol, name, name in enabled if family is None else name == family)
+                result[step], seconds = timed(features, symbol_trace_groups(eq))
+                times.append((step, seconds))
+        for name in flags:
+                setattr(MathSymbol, name, name in enabled)
+        return result, times
+
+
+## the classification of the symbols of a large expression, one symbol at a time
+def classify_workload(copies = 4):
+        import classifier
+        import DPRL
+        trace_groups = symbol_trace_groups(large_expression(DPRL, int(copies)))
+        symbol_classifier, model_seconds = timed(classifier.Classifier, 'tree_39.txt', None)
+        result, seconds = timed(lambda: [symbol_classifier.classify(group) for group in trace_groups])
+        return result, [('symbol classifier', model_seconds), ('classify', seconds)]
+
+
+WORKLOADS = {
+        'stroke': stroke_workload,
+        'preprocessing': preprocessing_workload,
+        'collision': collision_workload,
+        'nearest': nearest_workload,
+        'segmentation': segmentation_workload,
+        'features': features_workload,
+        'classify': classify_workload,
+        }
+
+
+## run a workload with the modules of the tree of src_dir, in this process, and write its result,
+## the run time of its steps and its peak memory to result_file
+def run(workload, src_dir, result_file, *args):
+        src_dir = os.path.abspath(src_dir)
+        ## the modules are imported from src_dir, not from the directory of this file
+        sys.path[0] = src_dir
+        os.chdir(src_dir)
+        ## the memory of the modules themselves is not counted in the memory of the run
+        import DPRL
+        start_memory = resident_memory()
+        (result, times), seconds, peak = measured(WORKLOADS[workload], *args)
+        with open(result_file, 'wb') as rfile:
+                pickle.dump((result, times, seconds, start_memory, peak), rfile, pickle.HIGHEST_PROTOCOL)
+
+
+## run a workload in a process of its own with the modules of the tree of src_dir
+def run_process(workload, src_dir, args):
+        handle, result_file = tempfile.mkstemp(prefix = 'dprl_benchmark_')
+        os.close(handle)
+        try:
+                subprocess.check_call([sys.executable, os.path.abspath(__file__), 'run', workload, src_dir, result_file] + list(args))
+                with open(result_file, 'rb') as rfile:
+                        return pickle.load(rfile)
+        finally:
+                os.remove(result_file)
+
+
+## the speedup of this tree over the baseline tree as printed, none for a step which the baseline
+## tree does not have
+def speedup(baseline_seconds, seconds):
+        if baseline_seconds == 0.0:
+                return '-'
+        return '%.1fx' % (baseline_seconds / max(seconds, 1e-9))
+
+
+## run a workload with the baseline tree of baseline_dir and with this tree, and compare them
+def benchmark(workload, baseline_dir, *args):
+        if workload not in WORKLOADS:
+                raise Exception('unknown workload %s' % workload)
+        this_dir = os.path.dirname(os.path.abspath(__file__))
+        baseline_result, baseline_times, baseline_seconds, baseline_start, baseline_peak = run_process(workload, baseline_dir, args)
+        result, times, seconds, start_memory, peak = run_process(workload, this_dir, args)
+        if not same_result(result, baseline_result):
+                raise Exception('the %s workload gives different results with the baseline tree' % workload)
+
+        print('%-24s %12s %12s %9s' % (workload, 'baseline', 'this tree', 'speedup'))
+        for (step, baseline_time), (step, step_time) in zip(baseline_times, times) + [(('total', baseline_seconds), ('total', seconds))]:
+                print('%-24s %10.3f s %10.3f s %9s' % (step, baseline_time, step_time, speedup(baseline_time, step_time)))
+        print('%-24s %9.1f MB %9.1f MB' % ('memory of the modules', baseline_start, start_memory))
+        print('%-24s %9.1f MB %9.1f MB' % ('peak memory of the run', baseline_peak - baseline_start, peak - start_memory))
+
+
+if __name__ == '__main__':
+        if len(sys.argv) < 3 or not (sys.argv[1] in WORKLOADS or sys.argv[1] == 'run'):
+                usage_statement = [
+                        'Usage: python benchmarks.py <workload> <baseline_src> [<arguments>]',
+                        'where workload and its arguments are:',
+                        'stroke [<copies>]',
+                        'preprocessing [<copies>]',
+                        'collision [<copies>]',
+                        'nearest [<copies>]',
+                        'segmentation [<copies>]',
+                        'features [<copies>]',
+                        'classify [<copies>]'
+                        ]
+                sys.exit('\n\t'.join(usage_statement))
+
+        if sys.argv[1] == 'run':
+                run(*sys.argv[2:])
+        else:
+                benchmark(*sys.argv[1:])
@@ -0,0 +1,338 @@
+##    DPRL CROHME 2013
+##    Copyright (c) 2013-2014 Lei Hu, Kenny Davila, Francisco Alvaro, Richard Zanibbi
+##
+##    This file is part of DPRL CROHME 2013.
+##
+##    DPRL CROHME 2013 is free software:
+##    you can redistribute it and/or modify it under the terms of the GNU
+##    General Public License as published by the Free Software Foundation,
+##    either version 3 of the License, or (at your option) any later version.
+##
+##    DPRL CROHME 2013 is distributed in the hope that it will be useful,
+##    but WITHOUT ANY WARRANTY; without even the implied warranty of
+##    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##    GNU General Public License for more details.
+##
+##    You should have received a copy of the GNU General Public License
+##    along with DPRL CROHME 2013.
+##    If not, see <http://www.gnu.org/licenses/>.
+##
+##    Contact:
+##        - Lei Hu: lei.hu@rit.edu
+##        - Kenny Davila: kxd7282@rit.edu
+##        - Francisco Alvaro: falvaro@dsic.upv.es
+##        - Richard Zanibbi: rlaz@cs.rit.edu
+
+import math
+import numpy as np
+from c45_tree_node import *
+
+#The boosted C4.5 trees of the symbol classifier compiled into flat lists:
+#  - every node has a type, an attribute, a threshold and its two children
+#    (continuous nodes), the means of its clusters (vector nodes), and the
+#    position of its first child in a list shared by all the nodes
+#  - every node that can end an evaluation (leaves, and discrete nodes for
+#    unknown values) has a row in a dense matrix with the probabilities of
+#    its samples weights, already normalized and multiplied by the alpha of
+#    its tree
+#Each tree is then followed with a loop and the rows of the leaves reached
+#are added in the order of the trees, which gives the same confidences as
+#Classifier.probabilisticClassify
+
+class CompiledC45Ensemble:
+    def __init__(self, trees, alphas, classes):
+        #the columns of the leaf matrix: the given classes, then any other
+        #label found in the trees
+        self.classes = list(classes)
+        self.class_columns = dict((label, k) for k, label in enumerate(self.classes))
+
+        self.types = []
+        self.attributes = []
+        self.thresholds = []
+        self.means = []
+        self.low_child = []
+        self.high_child = []
+        self.first_child = []
+        self.discrete_children = []
+        self.rows = []
+        self.children = []
+
+        row_weights = []
+        self.roots = [self.compileNode(tree, alpha, row_weights) for tree, alpha in zip(trees, alphas)]
+
+        #the sum of the alphas, added in the order of the trees
+        self.total_alpha = 0.0
+        for alpha in alphas:
+            self.total_alpha += alpha
+
+        self.leaf_probabilities, self.leaf_labels = self.leafMatrix(row_weights)
+        self.compileArrays()
+
+    def compileNode(self, node, alpha, row_weights):
+        position = len(self.types)
+        self.types.append(node.type)
+        self.attributes.append(getattr(node, 'attribute', -1))
+        self.thresholds.append(getattr(node, 'threshold', 0.0))
+        self.means.append(getattr(node, 'means', None))
+        self.low_child.append(-1)
+        self.high_child.append(-1)
+        self.discrete_children.append(None)
+
+        if node.type == C45TreeNode.LEAF or node.type == C45TreeNode.DISCRETE:
+            self.rows.append(len(row_weights))
+            row_weights.append((alpha, node.samples_weights))
+        else:
+            self.rows.append(-1)
+
+        if node.type == C45TreeNode.CONTINUOUS:
+            keys = ['0', '1']
+        elif node.type == C45TreeNode.VECTOR:
+            keys = [str(k) for k in range(len(node.means))]
+        elif node.type == C45TreeNode.DISCRETE:
+            keys = node.children.keys()
+        else:
+            keys = []
+
+        #the children of a node are next to each other in self.children
+        first = len(self.children)
+        self.first_child.append(first)
+        self.children.extend([-1] * len(keys))
+        for k in range(len(keys)):
+            self.children[first + k] = self.compileNode(node.children[keys[k]], alpha, row_weights)
+
+        #the children of the continuous splits, <= threshold and > threshold
+        if node.type == C45TreeNode.CONTINUOUS:
+            self.low_child[position] = self.children[first]
+            self.high_child[position] = self.children[first + 1]
+
+        if node.type == C45TreeNode.DISCRETE:
+            self.discrete_children[position] = dict((keys[k], self.children[first + k]) for k in range(len(keys)))
+
+        return position
+
+    def leafMatrix(self, row_weights):
+        #labels that are not in the class list get their own columns
+        for alpha, weights in row_weights:
+            for label in weights:
+                if not label in self.class_columns:
+                    self.class_columns[label] = len(self.classes)
+                    self.classes.append(label)
+
+        probabilities = np.zeros((len(row_weights), len(self.classes)))
+        labels = np.zeros((len(row_weights), len(self.classes)), dtype = bool)
+        for row in range(len(row_weights)):
+            alpha, weights = row_weights[row]
+
+            #normalize the weights as probabilisticClassify does, adding them
+            #in the order of the dictionary
+            total_weight = 0.0
+            for label in weights:
+                total_weight += weights[label]
+
+            for label in weights:
+                column = self.class_columns[label]
+                if total_weight == 0.0:
+                    #the division fails when this leaf is reached
+                    probabilities[row, column] = np.nan
+                else:
+                    probabilities[row, column] = alpha * (weights[label] / total_weight)
+                labels[row, column] = True
+
+        return probabilities, labels
+
+    def compileArrays(self):
+        #the same lists as arrays, to follow the trees for many samples at once
+        self.type_array = np.array(self.types)
+        self.attribute_array = np.array(self.attributes)
+        self.threshold_array = np.array(self.thresholds, dtype = float)
+        self.low_child_array = np.array(self.low_child)
+        self.high_child_array = np.array(self.high_child)
+        self.first_child_array = np.array(self.first_child)
+        self.children_array = np.array(self.children, dtype = int)
+        self.row_array = np.array(self.rows)
+
+        #the means of the vector nodes, padded to the largest number of means
+        #and of dimensions, mean_counts tells how many of them are real
+        vector_nodes = [node for node in range(len(self.types)) if self.types[node] == C45TreeNode.VECTOR]
+        self.vector_position = np.zeros(len(self.types), dtype = int)
+        self.vector_position[vector_nodes] = np.arange(len(vector_nodes))
+        mean_num = max([len(self.means[node]) for node in vector_nodes] + [1])
+        dimension_num = max([len(mean) for node in vector_nodes for mean in self.means[node]] + [1])
+        self.mean_array = np.zeros((len(vector_nodes), mean_num, dimension_num))
+        self.mean_counts = np.zeros(len(vector_nodes), dtype = int)
+        for k in range(len(vector_nodes)):
+            means = self.means[vector_nodes[k]]
+            self.mean_counts[k] = len(means)
+            for m in range(len(means)):
+                self.mean_array[k, m, :len(means[m])] = means[m]
+
+        #the attributes split by vector nodes, and by any node
+        self.vector_attributes = sorted(set(self.attributes[node] for node in vector_nodes))
+        self.used_attributes = sorted(set(self.attributes[node] for node in range(len(self.types)) if self.types[node] != C45TreeNode.LEAF))
+
+    def sampleArrays(self, samples):
+        #a matrix with the scalar attributes of the samples, and one matrix for
+        #each attribute that vector nodes split
+        #an attribute that is not a number never goes to the low child of a
+        #continuous split, as in python 2 numbers are smaller than any list or
+        #string, it is nan in the matrix; None is smaller than any number
+        #only the attributes that the nodes split are read, the others are nan
+        scalars = []
+        for sample in samples:
+            row = [np.nan] * len(sample)
+            for attribute in self.used_attributes:
+                value = sample[attribute]
+                if value is None:
+                    row[attribute] = -np.inf
+                elif isinstance(value, (int, long, float, np.number)):
+                    row[attribute] = value
+            scalars.append(row)
+        scalars = np.array(scalars, dtype = float).reshape(len(samples), -1)
+
+        vectors = {}
+        for attribute in self.vector_attributes:
+            values = [sample[attribute] for sample in samples]
+            lengths = set(len(value) for value in values)
+            if len(lengths) > 1:
+                raise Exception("vector attribute " + str(attribute) + " with different lengths")
+            vectors[attribute] = np.array(values, dtype = float).reshape(len(samples), -1)
+
+        return scalars, vectors
+
+    def batchLeafRows(self, samples):
+        #the leaf rows reached by every sample in every tree, a (samples x trees)
+        #array, all the samples follow all the trees one level at a time
+        samples = list(samples)
+        tree_num = len(self.roots)
+        if len(samples) == 0:
+            return np.zeros((0, tree_num), dtype = int)
+        scalars, vectors = self.sampleArrays(samples)
+
+        nodes = np.tile(np.array(self.roots, dtype = int), len(samples))
+        sample_of = np.repeat(np.arange(len(samples)), tree_num)
+        stopped = np.zeros(len(nodes), dtype = bool)
+        active = np.flatnonzero(self.type_array[nodes] != C45TreeNode.LEAF)
+        while len(active) > 0:
+            node = nodes[active]
+            node_type = self.type_array[node]
+
+            continuous = node_type == C45TreeNode.CONTINUOUS
+            if continuous.any():
+                split = active[continuous]
+                split_node = node[continuous]
+                low = scalars[sample_of[split], self.attribute_array[split_node]] <= self.threshold_array[split_node]
+                nodes[split] = np.where(low, self.low_child_array[split_node], self.high_child_array[split_node])
+
+            vector = node_type == C45TreeNode.VECTOR
+            for attribute in np.unique(self.attribute_array[node[vector]]):
+                same_attribute = vector & (self.attribute_array[node] == attribute)
+                split = active[same_attribute]
+                split_node = node[same_attribute]
+                values = vectors[attribute][sample_of[split]]
+                means = self.mean_array[self.vector_position[split_node]]
+
+                #distances to the means added over the dimensions in order, the
+                #padding means are never the closest, and ties go to the first mean
+                dist = np.zeros(means.shape[:2])
+                for d in range(values.shape[1]):
+                    diff = values[:, d, np.newaxis] - means[:, :, d]
+                    dist = dist + diff * diff
+                dist = np.sqrt(dist)
+                dist[np.arange(means.shape[1]) >= self.mean_counts[self.vector_position[split_node]][:, np.newaxis]] = np.inf
+                closest = np.argmin(dist, axis = 1)
+                nodes[split] = self.children_array[self.first_child_array[split_node] + closest]
+
+            discrete = np.flatnonzero(node_type == C45TreeNode.DISCRETE)
+            for k in discrete:
+                value = samples[sample_of[active[k]]][self.attributes[node[k]]]
+                if value in self.discrete_children[node[k]]:
+                    nodes[active[k]] = self.discrete_children[node[k]][value]
+                else:
+                    #unknown value for attribute, use the weights of this node
+                    stopped[active[k]] = True
+
+            active = active[(self.type_array[nodes[active]] != C45TreeNode.LEAF) & ~stopped[active]]
+
+        return self.row_array[nodes].reshape(len(samples), tree_num)
+
+    def batchProbabilities(self, samples):
+        #the confidences of every class for every sample, a (samples x classes)
+        #array, the rows of the leaves are added in the order of the trees
+        rows = self.batchLeafRows(samples)
+        confidences = np.zeros((len(rows), len(self.classes)))
+        for tree in range(rows.shape[1]):
+            confidences += self.leaf_probabilities[rows[:, tree]]
+        if np.isnan(confidences).any():
+            raise ZeroDivisionError("leaf without samples weight")
+
+        return confidences / self.total_alpha
+
+    def leafRows(self, sample):
+        types = self.types
+        attributes = self.attributes
+        thresholds = self.thresholds
+        low_child = self.low_child
+        high_child = self.high_child
+        first_child = self.first_child
+        children = self.children
+
+        rows = []
+        for node in self.roots:
+            node_type = types[node]
+            while node_type != C45TreeNode.LEAF:
+                if node_type == C45TreeNode.CONTINUOUS:
+                    if sample[attributes[node]] <= thresholds[node]:
+                        node = low_child[node]
+                    else:
+                        node = high_child[node]
+                elif node_type == C45TreeNode.VECTOR:
+                    #closest mean, same distances and ties as C45TreeNode
+                    value = sample[attributes[node]]
+                    closest = -1
+                    closest_dist = -1
+                    k = 0
+                    for mean in self.means[node]:
+                        dist = 0
+                        for d in range(len(value)):
+                            diff = (value[d] - mean[d])
+                            dist += diff * diff
+
+                        dist = math.sqrt(dist)
+                        if closest_dist < 0 or dist < closest_dist:
+                            closest_dist = dist
+                            closest = k
+                        k += 1
+
+                    node = children[first_child[node] + closest]
+                else:
+                    value = sample[attributes[node]]
+                    if not value in self.discrete_children[node]:
+                        #unknown value for attribute, use the weights of this node
+                        break
+                    node = self.discrete_children[node][value]
+
+                node_type = types[node]
+
+            rows.append(self.rows[node])
+
+        return rows
+
+    def rowConfidences(self, rows):
+        #the rows of the leaves are added one at a time in the order of the trees
+        confidences = np.add.accumulate(self.leaf_probabilities[rows], axis = 0)[-1]
+        if np.isnan(confidences).any():
+            raise ZeroDivisionError("leaf without samples weight")
+
+        return confidences / self.total_alpha
+
+    def probabilities(self, sample):
+        #the confidence of every class in self.classes
+        return self.rowConfidences(self.leafRows(sample))
+
+    def classProbabilities(self, sample):
+        #the confidences as a dictionary of the labels of the leaves reached
+        rows = self.leafRows(sample)
+        confidences = self.rowConfidences(rows)
+        reached = self.leaf_labels[rows].any(axis = 0)
+
+        return dict((self.classes[k], confidences[k]) for k in np.flatnonzero(reached))
@@ -0,0 +1,128 @@
+##    DPRL CROHME 2013
+##    Copyright (c) 2013-2014 Lei Hu, Kenny Davila, Francisco Alvaro, Richard Zanibbi
+##
+##    This file is part of DPRL CROHME 2013.
+##
+##    DPRL CROHME 2013 is free software:
+##    you can redistribute it and/or modify it under the terms of the GNU
+##    General Public License as published by the Free Software Foundation,
+##    either version 3 of the License, or (at your option) any later version.
+##
+##    DPRL CROHME 2013 is distributed in the hope that it will be useful,
+##    but WITHOUT ANY WARRANTY; without even the implied warranty of
+##    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##    GNU General Public License for more details.
+##
+##    You should have received a copy of the GNU General Public License
+##    along with DPRL CROHME 2013.
+##    If not, see <http://www.gnu.org/licenses/>.
+##
+##    Contact:
+##        - Lei Hu: lei.hu@rit.edu
+##        - Kenny Davila: kxd7282@rit.edu
+##        - Francisco Alvaro: falvaro@dsic.upv.es
+##        - Richard Zanibbi: rlaz@cs.rit.edu
+
+
+## Check of the label graphs written by label_graph.py against the ones of src/toyresult, which
+## were made with mergeLgCrohme. The symbols (segmentation and labels) of each expression are read
+## from its expected label graph, so the check does not depend on the symbol classifier: the
+## spatial relationship classifier, CROHME2013_parsing_MST and write_inherited_LG run as in
+## DPRL_CROHME2013_file, and the label graph must be the same, byte by byte.
+
+import os
+import sys
+import shutil
+import tempfile
+import DPRL
+import label_graph
+import spatial_relation
+
+
+## the lines of a label graph file
+def read_lines(LG_name):
+        with open(LG_name) as sfile:
+                return sfile.read().split('\n')
+
+
+## the first line where two label graphs differ, None if they are the same
+def first_difference(LG_name, expected_LG_name):
+        lines = read_lines(LG_name)
+        expected_lines = read_lines(expected_LG_name)
+        for k in range(max(len(lines), len(expected_lines))):
+                if k >= len(lines) or k >= len(expected_lines) or lines[k] != expected_lines[k]:
+                        return k + 1
+        return None
+
+
+## the symbols of a label graph, as (stroke ids, label) sorted by their first stroke, the strokes
+## of a symbol are joined by segmentation edges
+def read_symbols(LG_name):
+        labels = {}
+        same = {}
+        for line in read_lines(LG_name):
+                fields = line.split(', ')
+                if fields[0] == 'N':
+                        labels[int(fields[1])] = fields[2]
+                        same.setdefault(int(fields[1]), set()).add(int(fields[1]))
+                elif fields[0] == 'E' and fields[3] == '*':
+                        same.setdefault(int(fields[1]), set()).add(int(fields[2]))
+
+        symbols = []
+        for stroke_id in sorted(labels):
+                if stroke_id == min(same[stroke_id]):
+                        ## the label of the symbol, as the classifier gives it
+                        symbols.append((sorted(same[stroke_id]), labels[stroke_id].replace('COMMA', ',', 1)))
+        return symbols
+
+
+## parse the expression of an inkml file with the given symbols and write its label graph to LG_name
+def write_symbols_LG(inkml_name, symbols, relation_classifier, LG_name):
+        eq = DPRL.Equation.from_inkml(inkml_name)
+        symbol_candidate_list = []
+        for stroke_ids, label in symbols:
+                stroke_list = [eq.strokes[stroke_id] for stroke_id in stroke_ids]
+                points = []
+                for stroke in stroke_list:
+                        points = points + stroke.points
+                symbol_candidate_list.append(DPRL.symbol_candidate(label, stroke_list, points, [(label, 1.0)] * 3))
+
+        relation_cache = spatial_relation.RelationCache(relation_classifier)
+        relation_tree = DPRL.CROHME2013_parsing_MST(symbol_candidate_list, relation_cache)
+        label_graph.write_inherited_LG(LG_name, label_graph.inkml_UI(eq.dom), symbol_candidate_list, relation_tree)
+
+
+## check the label graphs of the inkml files of path against the ones of expected_path
+def check_label_graphs(path = 'toy', expected_path = 'toyresult'):
+        relation_classifier = spatial_relation.load_classifier(DPRL.RELATION_MODEL_FILE, DPRL.RELATION_PCA_FILE)
+        files = sorted(f for f in os.listdir(path) if os.path.splitext(f)[1] == '.inkml')
+        work_dir = tempfile.mkdtemp(prefix = 'dprl_check_')
+        failed = 0
+        try:
+                for filename in files:
+                        expected_LG_name = os.path.join(expected_path, filename[:len(filename)-6] + '.lg')
+                        LG_name = os.path.join(work_dir, filename[:len(filename)-6] + '.lg')
+                        write_symbols_LG(os.path.join(path, filename), read_symbols(expected_LG_name), relation_classifier, LG_name)
+                        line = first_difference(LG_name, expected_LG_name)
+                        if line is None:
+                                print('%s: same' % filename)
+                        else:
+                                failed += 1
+                                print('%s: DIFFERENT from line %d' % (filename, line))
+        finally:
+                shutil.rmtree(work_dir, ignore_errors = True)
+
+        if failed > 0:
+                raise Exception('%d label graphs differ from the expected ones' % failed)
+
+
+if __name__ == '__main__':
+        if len(sys.argv) < 2 or sys.argv[1] not in globals():
+                usage_statement = [
+                        'Usage: python check_toyresult.py <command>',
+                        'where command is:',
+                        'check_label_graphs [<input_path> <expected_path>]'
+                        ]
+                sys.exit('\n\t'.join(usage_statement))
+
+        globals()[sys.argv[1]](*sys.argv[2:])
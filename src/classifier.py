@@ -29,6 +29,7 @@ import os
 import fnmatch
 import numpy as np
 from c45_tree_node import *
+from c45_ensemble import *
 from traceInfo import *
 from mathSymbol import *
 
@@ -60,6 +61,13 @@ class Classifier:
             self.pca_mode = False
             self.all_classes = self.deduceClasses()
 
+        #the trees compiled into flat lists and a matrix of leaf probabilities
+        self.ensemble = CompiledC45Ensemble(self.trees, self.alphas, self.all_classes)
+
+        #by the flags of the enabled families of features, if the trees leave
+        #some of them out
+        self.lazy_families = {}
+
     def deduceClasses(self):
         classes = { }
         for tree in self.trees:
@@ -100,25 +108,33 @@ class Classifier:
         #create the symbol object...
         symbol = self.createSymbol( trace_group )
 
-        #get raw features
-        features = symbol.getFeatures()
-        
         if self.pca_mode:
-            #get the features in PCA space
-            features = self.featuresToPCA(features )            
+            #get the raw features in PCA space
+            features = self.featuresToPCA(symbol.getFeatures() )
+        else:
+            features = self.symbolFeatures( symbol )
 
-        #do the actual classification...
-        classes = self.probabilisticClassify( features )
+        #do the actual classification, the confidences of the compiled ensemble
+        #are in the order of the class list
+        confidences = self.ensemble.probabilities( features )
 
-        #now generate the sorted list...
-        confidences = [ ]
-        for label in self.all_classes:
-            if label in classes:
-                confidences.append( classes[label] )
-            else:
-                confidences.append( 0.0 )
+        return confidences[:len(self.all_classes)].tolist()
 
-        return confidences
+    def classify_batch( self, trace_groups, trace_cache = None ):
+        #the features of every group, one row per group
+        symbols = [ self.createSymbol( trace_group, trace_cache ) for trace_group in trace_groups ]
+
+        if self.pca_mode:
+            #get the features of all the groups in PCA space at once
+            features = self.featuresToPCA_batch( [ symbol.getFeatures() for symbol in symbols ] )
+        else:
+            features = [ self.symbolFeatures( symbol ) for symbol in symbols ]
+
+        #the ensemble follows the trees for all the groups together, one row
+        #of confidences per group in the order of the class list
+        confidences = self.ensemble.batchProbabilities( features )
+
+        return confidences[:, :len(self.all_classes)]
 
     def mostProbableLabel( self, confidences ):
         most_probable = 0
@@ -154,58 +170,57 @@ class Classifier:
 
         return results
 
-    def probabilisticClassify(self, values):    
-        output_class = {}
-        
-        total_alpha = 0.0
-        for i in range(len(self.trees)):
-            labels = self.trees[i].probabilistic_evaluate(values)
-            
-            #normalize the weights...
-            total_weight = 0.0
-            for label in labels:
-                total_weight += labels[label]
-                                
-            for label in labels:
-                labels[label] /= total_weight
-                            
-                #add the alpha value multiplied by the current probability
-                if label in output_class:
-                    output_class[label] += self.alphas[i] * labels[label]
-                else:
-                    output_class[label] = self.alphas[i] * labels[label]
-            
-            total_alpha += self.alphas[i]    
-        
-        #now normalize...
-        for label in output_class:
-            output_class[label] /= total_alpha
+    def mostProbableLabel_batch( self, confidences ):
+        #mostProbableLabel for every row of a (groups x classes) array, the
+        #first class wins the ties
+        confidences = np.asarray( confidences )
+        most_probable = np.argmax( confidences, axis = 1 )
 
-        return output_class
+        return [ (self.all_classes[i], float(confidences[row, i])) for row, i in enumerate(most_probable) ]
 
-    def createSymbol( self, trace_group ):
-        #first, create the traceInfo...
-        traces = []
-        for trace_id, points_f in trace_group:
-            #create object...
-            object_trace = TraceInfo(trace_id, points_f )
+    def topNLabels_batch( self, confidences, n_top ):
+        #topNLabels for every row of a (groups x classes) array, a stable sort
+        #keeps the classes with equal scores in the order of the class list
+        confidences = np.asarray( confidences )
+        top_relevant = np.argsort( -confidences, axis = 1, kind = 'mergesort' )[:, :n_top]
 
-            #apply general trace pre processing...        
-            #1) first step of pre processing: Remove duplicated points        
-            object_trace.removeDuplicatedPoints()
+        results = []
+        for row in range(len(confidences)):
+            results.append( [ (self.all_classes[i], float(confidences[row, i])) for i in top_relevant[row] ] )
 
-            #Add points to the trace...
-            object_trace.addMissingPoints()
+        return results
 
-            #Apply smoothing to the trace...
-            object_trace.applySmoothing()
+    def probabilisticClassify(self, values):
+        #the weights of the leaves reached, normalized and added with the alpha
+        #of each tree, come from the compiled ensemble
+        return self.ensemble.classProbabilities( values )
+
+    def symbolFeatures( self, symbol ):
+        #when no node of the trees splits some family of features, the families
+        #are computed as the trees read them, and that one never is. It is
+        #decided once for each set of enabled families
+        flags = tuple( getattr(MathSymbol, flag) for flag, family, family_types in MathSymbol.feature_families )
+        if not flags in self.lazy_families:
+            used = self.ensemble.used_attributes
+            self.lazy_families[flags] = False
+            for family, start, size in symbol.getFeatureFamilies():
+                if not any( start <= attribute < start + size for attribute in used ):
+                    self.lazy_families[flags] = True
+
+        if self.lazy_families[flags]:
+            return LazyFeatures(symbol)
+        else:
+            return symbol.getFeatures()
 
-            #it should not ... but .....
-            if object_trace.hasDuplicatedPoints():
-                #...remove them! ....
-                object_trace.removeDuplicatedPoints()
-                        
-            traces.append( object_trace )
+    def createSymbol( self, trace_group, trace_cache = None ):
+        #first, create the traceInfo... the traces already preprocessed for
+        #other groups come from the trace cache, when there is one
+        traces = []
+        for trace_id, points_f in trace_group:
+            if trace_cache is None:
+                traces.append( self.preprocessTrace( trace_id, points_f ) )
+            else:
+                traces.append( trace_cache.getTrace( trace_id, points_f ) )
 
         #now create the symbol
         new_symbol = MathSymbol(traces, '{Unknown}')
@@ -215,6 +230,27 @@ class Classifier:
 
         return new_symbol        
 
+    def preprocessTrace( self, trace_id, points_f ):
+        #create object...
+        object_trace = TraceInfo(trace_id, points_f )
+
+        #apply general trace pre processing...        
+        #1) first step of pre processing: Remove duplicated points        
+        object_trace.removeDuplicatedPoints()
+
+        #Add points to the trace...
+        object_trace.addMissingPoints()
+
+        #Apply smoothing to the trace...
+        object_trace.applySmoothing()
+
+        #it should not ... but .....
+        if object_trace.hasDuplicatedPoints():
+            #...remove them! ....
+            object_trace.removeDuplicatedPoints()
+
+        return object_trace
+
     def featuresToPCA(self, vector ):
         #first, apply normalization...
 
@@ -242,6 +278,89 @@ class Classifier:
 
         return projected
 
+    def featuresToPCA_batch(self, vectors ):
+        #featuresToPCA for a (groups x attributes) matrix, normalized and then
+        #projected with one matrix product
+        #the product can round the last digits differently from the dot
+        #products of featuresToPCA
+        if len(vectors) == 0:
+            return np.zeros( (0, self.pca_k) )
+        vectors = np.asarray( vectors, dtype = float )
+        att_means = np.array( [ att_mean for att_mean, att_std in self.normalization[:vectors.shape[1]] ] )
+        att_stds = np.array( [ att_std for att_mean, att_std in self.normalization[:vectors.shape[1]] ] )
+        values = vectors - att_means
+        scaled = att_stds > 0.0
+        values[:, scaled] /= att_stds[scaled]
+
+        #in case that K > # of atts, then just clamp....
+        k = min(self.pca_k, vectors.shape[1])
+        components = np.array( [ np.asarray( self.pca_vectors[i] ).ravel() for i in range(k) ] )
+
+        return np.dot( values, components.T ).real
+
+#==================================================
+# Confidences of the symbol hypotheses of one expression
+#==================================================
+class TraceCache:
+    def __init__(self, classifier):
+        #the traces preprocessed by the classifier, by stroke id and points,
+        #only the normalization of the symbol depends on the other traces
+        self.classifier = classifier
+        self.traces = {}
+        self.hits = 0
+        self.misses = 0
+
+    def getTrace( self, trace_id, points ):
+        #a copy of the preprocessed trace, the symbol normalizes it
+        key = ( trace_id, tuple( map(tuple, points) ) )
+        if key in self.traces:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.traces[key] = self.classifier.preprocessTrace( trace_id, points )
+
+        return self.traces[key].copy()
+
+
+class ClassificationCache:
+    def __init__(self, classifier, traces):
+        #traces maps the stroke ids of the expression to their original points
+        self.classifier = classifier
+        self.traces = traces
+        self.trace_cache = TraceCache( classifier )
+        self.confidences = {}
+        self.hits = 0
+        self.misses = 0
+
+    def classify_groups( self, stroke_groups ):
+        #the confidences of every group of stroke ids, a (groups x classes) array,
+        #a group is known by its strokes in order, as the order of the traces
+        #changes the last bits of some features, and the groups not seen before
+        #are classified together
+        keys = [ tuple(group) for group in stroke_groups ]
+        missing = [ ]
+        missing_groups = [ ]
+        for key, group in zip(keys, stroke_groups):
+            if key in self.confidences or key in missing:
+                self.hits += 1
+            else:
+                missing.append( key )
+                missing_groups.append( group )
+        self.misses += len(missing)
+
+        if len(missing) > 0:
+            trace_groups = [ [ (stroke_id, self.traces[stroke_id]) for stroke_id in group ] for group in missing_groups ]
+            confidences = self.classifier.classify_batch( trace_groups, self.trace_cache )
+            for key, row in zip(missing, confidences):
+                self.confidences[key] = row
+
+        return np.array( [ self.confidences[key] for key in keys ] ).reshape( len(keys), len(self.classifier.all_classes) )
+
+    def classify_group( self, stroke_group ):
+        #the confidences of one group of stroke ids, as classify returns them
+        return self.classify_groups( [ stroke_group ] )[0].tolist()
+
+
 ##def main():
 ##    #usage check
 ##    if len(sys.argv) < 2 or len(sys.argv) > 3:
@@ -0,0 +1,218 @@
+##    DPRL CROHME 2013
+##    Copyright (c) 2013-2014 Lei Hu, Kenny Davila, Francisco Alvaro, Richard Zanibbi
+##
+##    This file is part of DPRL CROHME 2013.
+##
+##    DPRL CROHME 2013 is free software: 
+##    you can redistribute it and/or modify it under the terms of the GNU 
+##    General Public License as published by the Free Software Foundation, 
+##    either version 3 of the License, or (at your option) any later version.
+##
+##    DPRL CROHME 2013 is distributed in the hope that it will be useful,
+##    but WITHOUT ANY WARRANTY; without even the implied warranty of
+##    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##    GNU General Public License for more details.
+##
+##    You should have received a copy of the GNU General Public License
+##    along with DPRL CROHME 2013.  
+##    If not, see <http://www.gnu.org/licenses/>.
+##
+##    Contact:
+##        - Lei Hu: lei.hu@rit.edu
+##        - Kenny Davila: kxd7282@rit.edu
+##        - Francisco Alvaro: falvaro@dsic.upv.es
+##        - Richard Zanibbi: rlaz@cs.rit.edu 
+
+
+## Label graph (.lg) of a recognized expression with inherited relationships, written directly from
+## the symbols and the relation tree of the parser. This gives the same file as merging the label
+## graph of the parser relations with the inkml file (crohmelib/bin/mergeLgCrohme: lg2txt, TXL,
+## crohme2lg.pl):
+##  - the parser relations are reduced to the layout tree (the edge from a dominant symbol to every
+##    symbol of its group is implied by the edge to the first one of them),
+##  - a symbol gets the relation of each of its tree edges with every symbol below the child,
+##  - as in the MathML normalization of crohme2lg.pl, the first symbol in a square root keeps no
+##    R relationship with the rest of the symbols in the root,
+##  - a fraction line with symbols above it and none below is a line under the first of them,
+##    which takes its place in the layout tree and has the line below it (see toyresult/10_em_89.lg),
+##  - the nodes and the edges are sorted by stroke id, the segmentation edges use 1.000.
+
+## the relation of the edges of the parser that do not go to the label graph
+SAME_RELATION = 'Same'
+SQRT_LABEL = '\\sqrt'
+## the labels of the fraction lines
+LINE_LABELS = ['-', '\\frac']
+
+
+## the value of the UI annotation of an inkml document (minidom), used as IUD of the label graph
+def inkml_UI(dom):
+        UI = ''
+        for node in dom.documentElement.childNodes:
+                if node.nodeType == node.ELEMENT_NODE and node.tagName == 'annotation' and node.getAttribute('type') == 'UI':
+                        UI += ''.join(child.data for child in node.childNodes if child.nodeType == child.TEXT_NODE)
+        return UI
+
+
+## the symbols reachable from each symbol following the edges of children (lists of child indices)
+def reachable(children):
+        reach = []
+        for start in range(len(children)):
+                seen = set()
+                stack = list(children[start])
+                while len(stack) > 0:
+                        node = stack.pop()
+                        if node not in seen:
+                                seen.add(node)
+                                stack.extend(children[node])
+                reach.append(seen)
+        return reach
+
+
+## the layout tree of the relation tree of the parser: a list of (parent, child, relation) with the
+## symbols as indices in symbol_candidate_list, without the edges implied by a path of other edges
+def layout_tree(symbol_candidate_list, relation_tree):
+        index = dict((id(sym), i) for i, sym in enumerate(symbol_candidate_list))
+
+        relations = {}
+        order = []
+        for parent_list, child_list, relation in relation_tree:
+                if relation == SAME_RELATION:
+                        continue
+                for parent in parent_list:
+                        for child in child_list:
+                                edge = (index[id(parent)], index[id(child)])
+                                if edge not in relations:
+                                        order.append(edge)
+                                relations[edge] = relation
+
+        children = [[] for sym in symbol_candidate_list]
+        for parent, child in order:
+                children[parent].append(child)
+        reach = reachable(children)
+
+        tree = []
+        for parent, child in order:
+                implied = False
+                for other in children[parent]:
+                        if other != child and child in reach[other]:
+                                implied = True
+                                break
+                if not implied:
+                        tree.append((parent, child, relations[(parent, child)]))
+        return tree
+
+
+## the layout tree with the lines under symbols (the fraction lines with A edges and no B edge)
+## moved below the first symbol over them: that symbol gets the edges of the line and a B edge to it
+def move_underlines(symbol_candidate_list, tree):
+        relations = [set() for sym in symbol_candidate_list]
+        for parent, child, relation in tree:
+                relations[parent].add(relation)
+
+        base = {}
+        for parent, child, relation in tree:
+                if relation == 'A' and 'B' not in relations[parent] and parent not in base and symbol_candidate_list[parent].symbol_label in LINE_LABELS:
+                        base[parent] = child
+
+        ## the symbol that takes the place of a symbol in the tree, a line under a line goes under its base
+        def head(i):
+                while i in base:
+                        i = base[i]
+                return i
+
+        moved = []
+        for parent, child, relation in tree:
+                if base.get(parent) == child and relation == 'A':
+                        continue
+                moved.append((head(parent), head(child), relation))
+        for line in sorted(base):
+                moved.append((head(line), line, 'B'))
+        return moved
+
+
+## the relationships between symbols with inheritance: {(parent, symbol): relation}
+def inherited_relations(symbol_candidate_list, tree):
+        children = [[] for sym in symbol_candidate_list]
+        for parent, child, relation in tree:
+                children[parent].append((child, relation))
+
+        ## the first symbols inside a square root, their R edges are not inherited
+        root_heads = set()
+        for parent, child, relation in tree:
+                if relation == 'I' and symbol_candidate_list[parent].symbol_label == SQRT_LABEL:
+                        root_heads.add(child)
+
+        reach = reachable([[child for child, relation in children[i]] for i in range(len(children))])
+
+        inherited = {}
+        for parent in range(len(symbol_candidate_list)):
+                for child, relation in children[parent]:
+                        if relation == 'R' and parent in root_heads:
+                                continue
+                        for symbol in [child] + sorted(reach[child]):
+                                if (parent, symbol) not in inherited:
+                                        inherited[(parent, symbol)] = relation
+        return inherited
+
+
+## the label of a symbol in the label graph
+def node_label(symbol_candidate, tree_relations):
+        label = symbol_candidate.symbol_label
+        ## a fraction becomes an mfrac, which is labeled '-'
+        if label == '\\frac' and ('A' in tree_relations or 'B' in tree_relations):
+                label = '-'
+        if label == '':
+                label = '_'
+        return label.replace(',', 'COMMA', 1)
+
+
+## write the label graph with inherited relationships of a recognized expression to LG_name,
+## UI is the IUD of the expression (see inkml_UI)
+def write_inherited_LG(LG_name, UI, symbol_candidate_list, relation_tree):
+        tree = layout_tree(symbol_candidate_list, relation_tree)
+
+        tree_relations = [set() for sym in symbol_candidate_list]
+        for parent, child, relation in tree:
+                tree_relations[parent].add(relation)
+        inherited = inherited_relations(symbol_candidate_list, move_underlines(symbol_candidate_list, tree))
+
+        nodes = []
+        for i, sym in enumerate(symbol_candidate_list):
+                label = node_label(sym, tree_relations[i])
+                for stroke in sym.stroke_list:
+                        nodes.append((stroke.id, label))
+        nodes.sort()
+
+        used = set()
+        edges = []
+        for (parent, symbol), relation in inherited.items():
+                used.add(parent)
+                used.add(symbol)
+                for stroke_1 in symbol_candidate_list[parent].stroke_list:
+                        for stroke_2 in symbol_candidate_list[symbol].stroke_list:
+                                edges.append((stroke_1.id, stroke_2.id, relation + ', 1.0'))
+
+        ## the segmentation edges of the symbols in the layout tree
+        for i in used:
+                for stroke_1 in symbol_candidate_list[i].stroke_list:
+                        for stroke_2 in symbol_candidate_list[i].stroke_list:
+                                if stroke_1.id != stroke_2.id:
+                                        edges.append((stroke_1.id, stroke_2.id, '*, 1.000'))
+        edges.sort()
+
+        with open(LG_name, 'w') as sfile:
+                sfile.write('# IUD, ' + UI + '\n')
+                sfile.write('# Nodes:\n')
+                for stroke_id, label in nodes:
+                        sfile.write('N, %d, %s, 1.0\n' % (stroke_id, label))
+                sfile.write('\n# Edges:\n')
+                for stroke_1, stroke_2, value in edges:
+                        sfile.write('E, %d, %d, %s\n' % (stroke_1, stroke_2, value))
+
+                ## symbols out of the layout tree, named as the segments of the MathML of lg2txt
+                if len(used) < len(symbol_candidate_list):
+                        sfile.write('# !! Unused symbols; defined but not in layout tree\n')
+                        for i, sym in enumerate(symbol_candidate_list):
+                                if i not in used:
+                                        sfile.write('# !! Unused symbol : ' + ''.join('%d:' % stroke_id for stroke_id in sorted(s.id for s in sym.stroke_list)) + '\n')
+        return LG_name
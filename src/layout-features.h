@@ -0,0 +1,41 @@
+/*
+    DPRL CROHME 2013
+    Copyright (c) 2013-2014 Lei Hu, Kenny Davila, Francisco Alvaro, Richard Zanibbi
+
+    This file is part of DPRL CROHME 2013.
+
+    DPRL CROHME 2013 is free software: 
+    you can redistribute it and/or modify it under the terms of the GNU 
+    General Public License as published by the Free Software Foundation, 
+    either version 3 of the License, or (at your option) any later version.
+
+    DPRL CROHME 2013 is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with DPRL CROHME 2013.  
+    If not, see <http://www.gnu.org/licenses/>.
+
+    Contact:
+        - Lei Hu: lei.hu@rit.edu
+        - Kenny Davila: kxd7282@rit.edu
+        - Francisco Alvaro: falvaro@dsic.upv.es
+        - Richard Zanibbi: rlaz@cs.rit.edu 
+*/
+
+#ifndef _LAYOUT_FEATURES_
+#define _LAYOUT_FEATURES_
+
+#include "symbol.h"
+
+//Number of features of a symbol pair: 9 geometric features, 31 PSM
+//features projected with PCA and the end mark
+#define LAYOUT_FEATURES 41
+
+float **loadPCA( const char *path, int *rows );
+void freePCA( float **pca, int rows );
+void psm(symbol *s1, symbol *s2, svm_node *sample, float **pca);
+
+#endif
@@ -0,0 +1,127 @@
+##    DPRL CROHME 2013
+##    Copyright (c) 2013-2014 Lei Hu, Kenny Davila, Francisco Alvaro, Richard Zanibbi
+##
+##    This file is part of DPRL CROHME 2013.
+##
+##    DPRL CROHME 2013 is free software:
+##    you can redistribute it and/or modify it under the terms of the GNU
+##    General Public License as published by the Free Software Foundation,
+##    either version 3 of the License, or (at your option) any later version.
+##
+##    DPRL CROHME 2013 is distributed in the hope that it will be useful,
+##    but WITHOUT ANY WARRANTY; without even the implied warranty of
+##    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##    GNU General Public License for more details.
+##
+##    You should have received a copy of the GNU General Public License
+##    along with DPRL CROHME 2013.
+##    If not, see <http://www.gnu.org/licenses/>.
+##
+##    Contact:
+##        - Lei Hu: lei.hu@rit.edu
+##        - Kenny Davila: kxd7282@rit.edu
+##        - Francisco Alvaro: falvaro@dsic.upv.es
+##        - Richard Zanibbi: rlaz@cs.rit.edu
+
+
+import numpy as np
+
+## the y coordinates of a normalized expression go from 0 to this height
+NORMALIZED_HEIGHT = 200.0
+
+## the resampling adds points along each line between two points at these fractions of it
+RESAMPLING_STEPS = np.arange(0.0, 1.0, 3.125e-1)
+
+
+## the points of the strokes, in the given order, packed in one (n, 2) array, and the offsets of
+## the strokes in it (the points of stroke k are points[offsets[k]:offsets[k + 1]])
+def pack_strokes(strokes):
+        offsets = np.cumsum([0] + [len(stroke.array) for stroke in strokes])
+        if not strokes:
+                return np.zeros((0, 2)), offsets
+        return np.concatenate([stroke.array[:,:2] for stroke in strokes]), offsets
+
+
+## position of the stroke of every point, and which points are the first and the last ones of their stroke
+def stroke_layout(offsets):
+        lengths = np.diff(offsets)
+        stroke_of = np.repeat(np.arange(len(lengths)), lengths)
+        first = np.zeros(offsets[-1], dtype = bool)
+        last = np.zeros(offsets[-1], dtype = bool)
+        first[offsets[:-1][lengths > 0]] = True
+        last[offsets[1:][lengths > 0] - 1] = True
+        return stroke_of, first, last
+
+
+## offsets of the strokes after keeping only some of the points
+def kept_offsets(offsets, keep):
+        stroke_of = stroke_layout(offsets)[0]
+        counts = np.bincount(stroke_of[keep], minlength = len(offsets) - 1)
+        return np.concatenate([[0], np.cumsum(counts)])
+
+
+## round to the nearest integer with halves away from zero, as round() does in python 2
+## (numpy rounds halves to even)
+def round_half_away(x):
+        magnitude = np.abs(x)
+        whole = np.trunc(magnitude)
+        with np.errstate(invalid = 'ignore'):
+                return np.copysign(whole + (magnitude - whole >= 0.5), x)
+
+
+## move the expression to the origin and scale it to a height of 200, keeping its aspect ratio
+def normalize(points, offsets):
+        min_x, min_y = points.min(axis = 0)
+        max_y = points[:,1].max()
+        normalize_ratio = NORMALIZED_HEIGHT/(max_y - min_y)
+        normalized = points.copy()
+        normalized[:,0] = normalized[:,0] - min_x
+        normalized[:,1] = normalized[:,1] - min_y
+        return normalized*normalize_ratio, offsets
+
+
+## delete the points that repeat the point before them in the same stroke
+def delete_duplicate_points(points, offsets):
+        stroke_of, first, last = stroke_layout(offsets)
+        keep = first.copy()
+        keep[1:] |= (points[1:] != points[:-1]).any(axis = 1)
+        return points[keep], kept_offsets(offsets, keep)
+
+
+## replace every point but the first and the last ones of a stroke by the average of the point
+## before it, itself and the point after it
+def smooth(points, offsets):
+        stroke_of, first, last = stroke_layout(offsets)
+        inner = np.flatnonzero(~first & ~last)
+        smoothed = points.copy()
+        smoothed[inner] = (points[inner - 1] + points[inner] + points[inner + 1])/3.0
+        return smoothed, offsets
+
+
+## put points along the line from every point to the next one of its stroke, the last point of a
+## stroke is kept as it is, then round the coordinates to integers
+def resample(points, offsets):
+        stroke_of, first, last = stroke_layout(offsets)
+        counts = np.where(last, 1, len(RESAMPLING_STEPS))
+        starts = np.cumsum(counts) - counts
+        resampled = np.empty((counts.sum(), 2))
+
+        lines = np.flatnonzero(~last)
+        steps = (points[lines + 1] - points[lines])[:,np.newaxis,:]*RESAMPLING_STEPS[:,np.newaxis]
+        positions = starts[lines][:,np.newaxis] + np.arange(len(RESAMPLING_STEPS))
+        resampled[positions.ravel()] = (points[lines][:,np.newaxis,:] + steps).reshape(-1, 2)
+        ends = np.flatnonzero(last)
+        resampled[starts[ends]] = points[ends]
+
+        stroke_counts = np.bincount(stroke_of, weights = counts, minlength = len(offsets) - 1).astype(int)
+        return round_half_away(resampled), np.concatenate([[0], np.cumsum(stroke_counts)])
+
+
+## normalize the expression, then delete the repeated points, smooth, resample and delete the
+## repeated points again in every stroke
+def preprocess(points, offsets):
+        points, offsets = normalize(points, offsets)
+        points, offsets = delete_duplicate_points(points, offsets)
+        points, offsets = smooth(points, offsets)
+        points, offsets = resample(points, offsets)
+        return delete_duplicate_points(points, offsets)
@@ -0,0 +1,131 @@
+##    DPRL CROHME 2013
+##    Copyright (c) 2013-2014 Lei Hu, Kenny Davila, Francisco Alvaro, Richard Zanibbi
+##
+##    This file is part of DPRL CROHME 2013.
+##
+##    DPRL CROHME 2013 is free software:
+##    you can redistribute it and/or modify it under the terms of the GNU
+##    General Public License as published by the Free Software Foundation,
+##    either version 3 of the License, or (at your option) any later version.
+##
+##    DPRL CROHME 2013 is distributed in the hope that it will be useful,
+##    but WITHOUT ANY WARRANTY; without even the implied warranty of
+##    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##    GNU General Public License for more details.
+##
+##    You should have received a copy of the GNU General Public License
+##    along with DPRL CROHME 2013.
+##    If not, see <http://www.gnu.org/licenses/>.
+##
+##    Contact:
+##        - Lei Hu: lei.hu@rit.edu
+##        - Kenny Davila: kxd7282@rit.edu
+##        - Francisco Alvaro: falvaro@dsic.upv.es
+##        - Richard Zanibbi: rlaz@cs.rit.edu
+
+import os
+import tempfile
+import numpy as np
+
+## the binary cache of a text matrix is stored next to it with this suffix
+CACHE_SUFFIX = '.npz'
+
+## models already loaded by this process, keyed by the absolute paths of their files
+_loaded_models = {}
+
+
+## load a comma separated text matrix, going through a binary cache next to the text file
+## the cache remembers the size and modification time of the text it was built from, and
+## it is rebuilt whenever the text file changes
+def load_cached_matrix(text_file, delimiter = ','):
+        text_stat = os.stat(text_file)
+        cache_file = text_file + CACHE_SUFFIX
+
+        if os.path.exists(cache_file):
+                try:
+                        cache = np.load(cache_file)
+                        try:
+                                if cache['size'] == text_stat.st_size and cache['mtime'] == text_stat.st_mtime:
+                                        return cache['data']
+                        finally:
+                                cache.close()
+                except (IOError, KeyError, ValueError):
+                        ## unreadable or old cache, rebuild it below
+                        pass
+
+        data = np.loadtxt(text_file, delimiter = delimiter)
+        save_cached_matrix(cache_file, data, text_stat)
+        return data
+
+
+## write the cache to a temporary file first and rename it, so that concurrent
+## processes never read a half written cache
+## a read-only model directory only means that the text is parsed every time
+def save_cached_matrix(cache_file, data, text_stat):
+        try:
+                fd, temp_name = tempfile.mkstemp(suffix = CACHE_SUFFIX, dir = os.path.dirname(os.path.abspath(cache_file)))
+        except (IOError, OSError):
+                return
+        try:
+                with os.fdopen(fd, 'wb') as f:
+                        np.savez(f, data = data, size = text_stat.st_size, mtime = text_stat.st_mtime)
+                os.rename(temp_name, cache_file)
+        except (IOError, OSError):
+                if os.path.exists(temp_name):
+                        os.remove(temp_name)
+
+
+## the AdaBoost stroke pair classifier of the segmenter:
+## coeff are the PCA coefficients (one column per component) and classifiers holds
+## one decision stump per row (feature index, threshold, value below, value above)
+class SegmentationModel(object):
+        def __init__(self, coeff_file, adaboost_file, component_num = 100):
+                self.coeff_file = coeff_file
+                self.adaboost_file = adaboost_file
+                self.coeff = load_cached_matrix(coeff_file)
+                self.classifiers = load_cached_matrix(adaboost_file)
+                self.component_num = component_num
+
+                ## the projection matrix and the stumps as separate arrays
+                self.components = np.ascontiguousarray(self.coeff[:,:component_num])
+                self.stump_features = self.classifiers[:,0].astype(int)
+                self.stump_thresholds = self.classifiers[:,1]
+                self.stump_below = 1.0*self.classifiers[:,2]
+                self.stump_above = 1.0*self.classifiers[:,3]
+
+        ## the AdaBoost margins (sum_h) of all the stroke pairs of an expression, one row of
+        ## feature_matrix per pair, the strokes of a pair are merged when its margin is positive
+        def margins(self, feature_matrix):
+                X = np.asarray(feature_matrix, dtype = float)
+                if X.size == 0:
+                        return np.zeros(0)
+                X = np.atleast_2d(X)
+
+                ## get the PCA features of all the pairs with one matrix multiply
+                PCA_features = np.dot(X, self.components)
+                stump_input = PCA_features[:,self.stump_features]
+
+                ## the matrix multiply does not add the products in the same order as a sum over
+                ## one feature vector, a pair with a PCA feature that close to a stump threshold
+                ## is projected again adding in order so that its decisions do not change
+                error_bound = 2 * X.shape[1] * np.finfo(float).eps * np.dot(np.abs(X), np.abs(self.components))
+                close = np.abs(stump_input - self.stump_thresholds) <= error_bound[:,self.stump_features]
+                for i in np.flatnonzero(close.any(axis = 1)):
+                        PCA_features[i] = np.add.accumulate(X[i][:,np.newaxis]*self.components, axis = 0)[-1]
+                        stump_input[i] = PCA_features[i,self.stump_features]
+
+                ## evaluate every stump on every pair, the votes are added in the stump order
+                votes = np.where(stump_input < self.stump_thresholds, self.stump_below, self.stump_above)
+                return np.add.accumulate(votes, axis = 1)[:,-1]
+
+        ## the AdaBoost margin of one stroke pair
+        def margin(self, all_feature):
+                return self.margins([all_feature])[0]
+
+
+## get the segmentation model for the given files, loading it only the first time it is asked for
+def load_segmentation_model(coeff_file, adaboost_file):
+        key = (os.path.abspath(coeff_file), os.path.abspath(adaboost_file))
+        if key not in _loaded_models:
+                _loaded_models[key] = SegmentationModel(coeff_file, adaboost_file)
+        return _loaded_models[key]
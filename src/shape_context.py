@@ -0,0 +1,97 @@
+##    DPRL CROHME 2013
+##    Copyright (c) 2013-2014 Lei Hu, Kenny Davila, Francisco Alvaro, Richard Zanibbi
+##
+##    This file is part of DPRL CROHME 2013.
+##
+##    DPRL CROHME 2013 is free software:
+##    you can redistribute it and/or modify it under the terms of the GNU
+##    General Public License as published by the Free Software Foundation,
+##    either version 3 of the License, or (at your option) any later version.
+##
+##    DPRL CROHME 2013 is distributed in the hope that it will be useful,
+##    but WITHOUT ANY WARRANTY; without even the implied warranty of
+##    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##    GNU General Public License for more details.
+##
+##    You should have received a copy of the GNU General Public License
+##    along with DPRL CROHME 2013.
+##    If not, see <http://www.gnu.org/licenses/>.
+##
+##    Contact:
+##        - Lei Hu: lei.hu@rit.edu
+##        - Kenny Davila: kxd7282@rit.edu
+##        - Francisco Alvaro: falvaro@dsic.upv.es
+##        - Richard Zanibbi: rlaz@cs.rit.edu
+
+
+import math
+import numpy as np
+
+## the circle around a reference center is divided into 12 angles of pi/6 and 5 rings,
+## the rings end at 1/16, 1/8, 1/4 and 1/2 of the radius and the last one at the radius
+ANGLE_NUM = 12
+RING_NUM = 5
+RING_EDGES = np.array([1.0/16, 1.0/8, 1.0/4, 1.0/2])
+BIN_NUM = ANGLE_NUM * RING_NUM
+
+
+## the (x, y) coordinates of the points of some strokes as one (n, 2) array
+def stroke_points(strokes):
+        if not strokes:
+                return np.zeros((0, 2))
+        return np.concatenate([stroke.array[:,:2] for stroke in strokes])
+
+
+## distances of points from their offsets, computed as distance() does, with pow and not with a
+## product or hypot, which are one ulp away now and then, so that the features are the same ones
+## the segmenter was trained on
+def point_distance(dx, dy):
+        return np.sqrt(np.power(dx, 2.0) + np.power(dy, 2.0))
+
+
+## log-polar shape context of the points around one or several reference centers
+## points is an (n, 2) array, centers is one center or a (k, 2) array of them, and radius is one
+## value, one value per center or None for the smallest circle around each center that covers
+## all the points
+## returns a (k, 60) array (one row per center, the 12 angles by the 5 rings), each row is
+## normalized by the number of points inside its circle and it is all zeros if there are none
+def shape_context(points, centers, radius = None):
+        points = np.asarray(points, dtype = float).reshape(-1, 2)
+        centers = np.asarray(centers, dtype = float).reshape(-1, 2)
+        ## no center (an expression of one stroke has no stroke pair)
+        if centers.shape[0] == 0:
+                return np.zeros((0, BIN_NUM))
+
+        ## the offsets of every point from every center, one row per center
+        dx = points[:,0] - centers[:,0,np.newaxis]
+        dy = points[:,1] - centers[:,1,np.newaxis]
+        dist = point_distance(dx, dy)
+
+        if radius is None:
+                radius = dist.max(axis = 1) if points.shape[0] else np.zeros(centers.shape[0])
+        radius = np.broadcast_to(np.asarray(radius, dtype = float).reshape(-1, 1), dist.shape)
+        inside = dist <= radius
+
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                ## ring of each point, a zero radius puts every point in the first ring
+                ratio = np.where(radius == 0, 0.0, dist / radius)
+                ## angle to the horizontal line, in [0, pi], from the cosine as angle() finds it (with
+                ## a sum of products for the length) so that points on a bin border fall on the same
+                ## side, a point on the center has angle 0
+                length = np.sqrt(dx*dx + dy*dy)
+                cosine = np.where(length == 0, 1.0, dx / length)
+        rings = np.digitize(ratio.ravel(), RING_EDGES, right = True).reshape(ratio.shape)
+        angles = np.floor(1.5*(np.arccos(np.clip(cosine, -1.0, 1.0))/math.atan(1)))
+        ## the angles below the horizontal line go on from the last bin backwards
+        angles = np.where(dy >= 0, angles, ANGLE_NUM - 1 - angles).astype(int)
+
+        ## count the points of each center in its 60 bins
+        center_index = np.repeat(np.arange(centers.shape[0]), points.shape[0]).reshape(dist.shape)
+        bins = center_index*BIN_NUM + angles*RING_NUM + rings
+        counts = np.bincount(bins[inside], minlength = centers.shape[0]*BIN_NUM).reshape(-1, BIN_NUM)
+
+        point_number = inside.sum(axis = 1)
+        histogram = np.zeros(counts.shape)
+        has_points = point_number > 0
+        histogram[has_points] = counts[has_points] / point_number[has_points,np.newaxis].astype(float)
+        return histogram
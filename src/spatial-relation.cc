@@ -0,0 +1,99 @@
+/*
+    DPRL CROHME 2013
+    Copyright (c) 2013-2014 Lei Hu, Kenny Davila, Francisco Alvaro, Richard Zanibbi
+
+    This file is part of DPRL CROHME 2013.
+
+    DPRL CROHME 2013 is free software: 
+    you can redistribute it and/or modify it under the terms of the GNU 
+    General Public License as published by the Free Software Foundation, 
+    either version 3 of the License, or (at your option) any later version.
+
+    DPRL CROHME 2013 is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with DPRL CROHME 2013.  
+    If not, see <http://www.gnu.org/licenses/>.
+
+    Contact:
+        - Lei Hu: lei.hu@rit.edu
+        - Kenny Davila: kxd7282@rit.edu
+        - Francisco Alvaro: falvaro@dsic.upv.es
+        - Richard Zanibbi: rlaz@cs.rit.edu 
+*/
+
+//C interface to the spatial relationship classifier, so that it can be
+//loaded once and called in-process (e.g. from Python with ctypes)
+//instead of running ./layout for every pair of symbols
+
+#include <cstdio>
+#include <cstdlib>
+#include "symbol.h"
+#include "layout-features.h"
+
+using namespace std;
+
+struct relation_classifier {
+  SVMclass *model;
+  float **pca;
+  int pcaRows;
+};
+
+extern "C" {
+
+//Load the SVM model and the PCA matrix, NULL on error
+void *relation_classifier_load(const char *model_path, const char *pca_path) {
+  SVMclass *model = new SVMclass(model_path, false);
+  if( !model->isLoaded() ) {
+    delete model;
+    return NULL;
+  }
+
+  int pcaRows;
+  float **pca = loadPCA( pca_path, &pcaRows );
+  if( !pca ) {
+    delete model;
+    return NULL;
+  }
+
+  relation_classifier *rc = new relation_classifier;
+  rc->model = model;
+  rc->pca = pca;
+  rc->pcaRows = pcaRows;
+
+  return rc;
+}
+
+//Classify the relation between two symbols given in memory (see the
+//symbol constructor), probs receives the Sub, Hor and Sup probabilities
+int relation_classifier_classify(void *handle,
+                                 const char *label1, int ns1, const int *np1, const float *xy1,
+                                 const char *label2, int ns2, const int *np2, const float *xy2,
+                                 double *probs) {
+  relation_classifier *rc = (relation_classifier *)handle;
+
+  symbol s1(label1, ns1, np1, xy1);
+  symbol s2(label2, ns2, np2, xy2);
+  svm_node sample[LAYOUT_FEATURES];
+
+  //Compute Geometric Features
+  s1.BBfeatures( &s2, sample );
+
+  //Compute Shape-based features
+  psm(&s1, &s2, sample, rc->pca);
+
+  return rc->model->classify(sample, probs);
+}
+
+void relation_classifier_free(void *handle) {
+  relation_classifier *rc = (relation_classifier *)handle;
+
+  delete rc->model;
+  freePCA( rc->pca, rc->pcaRows );
+  delete rc;
+}
+
+}
@@ -0,0 +1,339 @@
+##    DPRL CROHME 2013
+##    Copyright (c) 2013-2014 Lei Hu, Kenny Davila, Francisco Alvaro, Richard Zanibbi
+##
+##    This file is part of DPRL CROHME 2013.
+##
+##    DPRL CROHME 2013 is free software:
+##    you can redistribute it and/or modify it under the terms of the GNU
+##    General Public License as published by the Free Software Foundation,
+##    either version 3 of the License, or (at your option) any later version.
+##
+##    DPRL CROHME 2013 is distributed in the hope that it will be useful,
+##    but WITHOUT ANY WARRANTY; without even the implied warranty of
+##    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##    GNU General Public License for more details.
+##
+##    You should have received a copy of the GNU General Public License
+##    along with DPRL CROHME 2013.
+##    If not, see <http://www.gnu.org/licenses/>.
+##
+##    Contact:
+##        - Lei Hu: lei.hu@rit.edu
+##        - Kenny Davila: kxd7282@rit.edu
+##        - Francisco Alvaro: falvaro@dsic.upv.es
+##        - Richard Zanibbi: rlaz@cs.rit.edu
+
+import os
+import ctypes
+import subprocess
+import threading
+import numpy as np
+
+## the classes in the order of the probabilities returned by the classifier
+RELATION_NAMES = ['Sub', 'Hor', 'Sup']
+
+## built from layout.cc, symbol.cc and svm-classifier.cc with 'make libspatialrelation.so'
+LIBRARY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'libspatialrelation.so')
+
+## the type of a symbol label as in symbol::setType (symbol.cc), used to place the vertical center
+## of the symbol: 'a' (ascender), 'd' (descender), 'm' (middle of the bounding box) or 'n' for the
+## rest. The classifier only sees the label through its type.
+SYMBOL_TYPES = {
+        'b': 'a',
+        '0': 'm',
+        '1': 'm',
+        '2': 'm',
+        '3': 'm',
+        '4': 'm',
+        '5': 'm',
+        '6': 'm',
+        '7': 'm',
+        '8': 'm',
+        '9': 'm',
+        'A': 'm',
+        'B': 'm',
+        '\\beta': 'd',
+        'C': 'm',
+        'd': 'a',
+        'E': 'm',
+        'f': 'a',
+        'F': 'm',
+        'g': 'd',
+        'G': 'm',
+        'h': 'a',
+        'H': 'm',
+        'I': 'm',
+        'j': 'd',
+        'l': 'a',
+        'L': 'm',
+        '\\lambda': 'a',
+        '\\lim': 'a',
+        'lpar': 'm',
+        'M': 'm',
+        '\\mu': 'd',
+        'N': 'm',
+        'p': 'd',
+        'P': 'm',
+        'q': 'd',
+        'R': 'm',
+        'rpar': 'm',
+        'S': 'm',
+        '\\sqrt': 'm',
+        't': 'a',
+        'T': 'm',
+        '\\tan': 'a',
+        '\\tg': 'a',
+        'V': 'm',
+        'X': 'm',
+        'y': 'd',
+        'Y': 'm',
+        }
+
+## the layout tool, run as a co-process ('layout --serve') when the library cannot be loaded
+LAYOUT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'layout')
+
+## number of symbol pairs sent to the co-process before reading their answers, small enough
+## for the answers (3 short lines per pair) to never fill the pipe while requests are written
+PIPELINE_WINDOW = 64
+
+
+## the label and the strokes of a symbol candidate of the parser, as classified by the classifiers below
+def symbol_request(sym):
+        return sym.symbol_label, [s.points for s in sym.stroke_list]
+
+
+## pack the strokes of a symbol as the number of points per stroke and one (points x 2) float array
+def pack_strokes(strokes):
+        counts = np.array([len(points) for points in strokes], dtype = np.int32)
+        xy = np.ascontiguousarray(np.concatenate([np.asarray(points, dtype = float).reshape(-1, 2) for points in strokes]), dtype = np.float32)
+        return counts, xy
+
+
+## the spatial relationship (Sub/Hor/Sup) classifier of layout.cc, running in this process:
+## the SVM model and the PCA matrix are loaded once, and symbol pairs are scored straight
+## from their points without temporary files or a process per pair
+class SpatialRelationClassifier(object):
+        def __init__(self, model_file, pca_file, library_file = LIBRARY_FILE):
+                try:
+                        self.library = ctypes.CDLL(library_file)
+                except OSError:
+                        raise Exception("Spatial relationship library not found: " + library_file + " (run make in the src folder)")
+
+                self.library.relation_classifier_load.restype = ctypes.c_void_p
+                self.library.relation_classifier_load.argtypes = [ctypes.c_char_p, ctypes.c_char_p]
+                self.library.relation_classifier_classify.restype = ctypes.c_int
+                self.library.relation_classifier_classify.argtypes = [ctypes.c_void_p,
+                        ctypes.c_char_p, ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p,
+                        ctypes.c_char_p, ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p,
+                        ctypes.c_void_p]
+                self.library.relation_classifier_free.restype = None
+                self.library.relation_classifier_free.argtypes = [ctypes.c_void_p]
+
+                self.handle = self.library.relation_classifier_load(model_file, pca_file)
+                if not self.handle:
+                        raise Exception("Error loading the spatial relationship model " + model_file + " / " + pca_file)
+
+        def __del__(self):
+                self.close()
+
+        def close(self):
+                if getattr(self, 'handle', None):
+                        self.library.relation_classifier_free(self.handle)
+                        self.handle = None
+
+        ## the Sub, Hor and Sup probabilities for two symbols, each given by its label and its strokes
+        ## (lists of (x, y) points), rounded as the layout tool prints them so that the parser
+        ## takes the same decisions as with ./layout
+        def classify_strokes(self, label_1, strokes_1, label_2, strokes_2):
+                counts_1, xy_1 = pack_strokes(strokes_1)
+                counts_2, xy_2 = pack_strokes(strokes_2)
+                probs = np.zeros(len(RELATION_NAMES))
+                self.library.relation_classifier_classify(self.handle,
+                        label_1, len(counts_1), counts_1.ctypes.data, xy_1.ctypes.data,
+                        label_2, len(counts_2), counts_2.ctypes.data, xy_2.ctypes.data,
+                        probs.ctypes.data)
+                return [float('%.4f' % p) for p in probs]
+
+        ## the probabilities for a list of symbol pairs, each given as (label_1, strokes_1, label_2, strokes_2)
+        def classify_many(self, pairs):
+                return [self.classify_strokes(*pair) for pair in pairs]
+
+        ## the same for two symbol candidates of the parser
+        def classify(self, sym_1, sym_2):
+                return self.classify_strokes(*(symbol_request(sym_1) + symbol_request(sym_2)))
+
+
+## write a symbol in the format of the files read by the layout tool
+def format_symbol(label, strokes):
+        lines = [label, '%d ' % len(strokes)]
+        for points in strokes:
+                lines.append('%d ' % len(points))
+                for p in points:
+                        lines.append('%f %f' % tuple(p))
+        return '\n'.join(lines) + '\n'
+
+
+## the same classifier for deployments that cannot load native code into the Python process:
+## one long running 'layout --serve' co-process loads the SVM model and the PCA matrix once,
+## and the symbol pairs are streamed to its stdin and the probabilities read back from its stdout.
+## Each process (e.g. each worker of a pool) starts its own co-process, and a co-process that
+## crashed is started again and the pairs it did not answer are sent again. Threads take turns
+## to use the co-process.
+class LayoutProcessClassifier(object):
+        def __init__(self, model_file, pca_file, layout_file = LAYOUT_FILE, window = PIPELINE_WINDOW):
+                if not os.access(layout_file, os.X_OK):
+                        raise Exception("Layout tool not found: " + layout_file + " (it is not in the repository, build it with make layout in the src folder)")
+                self.command = [layout_file, '--serve', model_file, pca_file]
+                self.window = window
+                self.process = None
+                self.owner_pid = None
+                self.restarts = 0
+                self.lock = threading.Lock()
+
+        def __del__(self):
+                self.close()
+
+        def start(self):
+                self.process = subprocess.Popen(self.command, stdin = subprocess.PIPE, stdout = subprocess.PIPE, close_fds = True)
+                self.owner_pid = os.getpid()
+
+        ## stop the co-process: it exits when its stdin is closed
+        def close(self):
+                process = getattr(self, 'process', None)
+                if process is None:
+                        return
+                self.process = None
+                ## a co-process inherited through fork belongs to the parent
+                if self.owner_pid != os.getpid():
+                        return
+                try:
+                        process.stdin.close()
+                        process.stdout.close()
+                except IOError:
+                        pass
+                if process.poll() is None:
+                        try:
+                                process.kill()
+                        except OSError:
+                                pass
+                process.wait()
+
+        ## send some pairs and add their answers to results, False if the co-process died on the way,
+        ## results then has the answers of the pairs before the first one it did not answer
+        def exchange(self, pairs, results):
+                if self.process is None or self.owner_pid != os.getpid():
+                        self.process = None
+                        self.start()
+                try:
+                        self.process.stdin.write(''.join(format_symbol(label_1, strokes_1) + format_symbol(label_2, strokes_2)
+                                                         for label_1, strokes_1, label_2, strokes_2 in pairs))
+                        self.process.stdin.flush()
+
+                        for pair in pairs:
+                                probs = []
+                                for name in RELATION_NAMES:
+                                        line = self.process.stdout.readline().split()
+                                        if len(line) != 2 or line[0] != name:
+                                                return False
+                                        probs.append(float(line[1]))
+                                results.append(probs)
+                        return True
+                except IOError:
+                        return False
+
+        ## the probabilities for a list of symbol pairs, each given as (label_1, strokes_1, label_2, strokes_2),
+        ## up to 'window' pairs are written before reading their answers
+        def classify_many(self, pairs):
+                with self.lock:
+                        return self.classify_windows(pairs)
+
+        def classify_windows(self, pairs):
+                results = []
+                for start in range(0, len(pairs), self.window):
+                        window = pairs[start:start + self.window]
+                        if not self.exchange(window, results):
+                                ## the co-process crashed, the pairs it did not answer are sent once more
+                                ## to a new one
+                                self.close()
+                                self.restarts += 1
+                                if not self.exchange(window[len(results) - start:], results):
+                                        self.close()
+                                        raise Exception("The layout co-process failed: " + ' '.join(self.command))
+                return results
+
+        def classify_strokes(self, label_1, strokes_1, label_2, strokes_2):
+                return self.classify_many([(label_1, strokes_1, label_2, strokes_2)])[0]
+
+        def classify(self, sym_1, sym_2):
+                return self.classify_strokes(*(symbol_request(sym_1) + symbol_request(sym_2)))
+
+
+
+## the type of a symbol label, see SYMBOL_TYPES
+def symbol_type(label):
+        return SYMBOL_TYPES.get(label, 'n')
+
+
+## the strokes of a symbol candidate identify it within an expression
+def symbol_key(sym):
+        return tuple(sorted(s.id for s in sym.stroke_list))
+
+
+## the relationship probabilities computed while parsing an expression, so that every pair of
+## symbols is sent to the classifier only once per pair of label types (labels of the same type
+## give the same features, see SYMBOL_TYPES)
+class RelationCache(object):
+        def __init__(self, classifier):
+                self.classifier = classifier
+                self.scores = {}
+                self.labels_seen = set()
+                self.hits = 0
+                self.misses = 0
+                ## hits for a pair of labels never asked before, answered with the scores of other labels of the same types
+                self.shared = 0
+
+        ## the probabilities for sym_1 (with its current label) and sym_2 with each one of labels_2,
+        ## the pairs not seen before are requested together
+        def classify_labels(self, sym_1, sym_2, labels_2):
+                key_1 = symbol_key(sym_1)
+                key_2 = symbol_key(sym_2)
+                type_1 = symbol_type(sym_1.symbol_label)
+
+                keys = []
+                missing = []
+                missing_labels = []
+                for label in labels_2:
+                        key = (key_1, type_1, key_2, symbol_type(label))
+                        label_key = (key_1, sym_1.symbol_label, key_2, label)
+                        if key in self.scores or key in missing:
+                                self.hits += 1
+                                if label_key not in self.labels_seen:
+                                        self.shared += 1
+                        else:
+                                missing.append(key)
+                                missing_labels.append(label)
+                        self.labels_seen.add(label_key)
+                        keys.append(key)
+                self.misses += len(missing)
+
+                if len(missing) > 0:
+                        request_1 = symbol_request(sym_1)
+                        strokes_2 = symbol_request(sym_2)[1]
+                        all_probs = self.classifier.classify_many([request_1 + (label, strokes_2) for label in missing_labels])
+                        for key, probs in zip(missing, all_probs):
+                                self.scores[key] = probs
+
+                return [self.scores[key] for key in keys]
+
+        ## the probabilities for two symbol candidates with their current labels
+        def classify(self, sym_1, sym_2):
+                return self.classify_labels(sym_1, sym_2, [sym_2.symbol_label])[0]
+
+
+## the spatial relationship classifier: in-process through the shared library when it can be
+## loaded, with a layout co-process otherwise
+def load_classifier(model_file, pca_file):
+        try:
+                return SpatialRelationClassifier(model_file, pca_file)
+        except Exception:
+                return LayoutProcessClassifier(model_file, pca_file)
@@ -0,0 +1,182 @@
+##    DPRL CROHME 2013
+##    Copyright (c) 2013-2014 Lei Hu, Kenny Davila, Francisco Alvaro, Richard Zanibbi
+##
+##    This file is part of DPRL CROHME 2013.
+##
+##    DPRL CROHME 2013 is free software:
+##    you can redistribute it and/or modify it under the terms of the GNU
+##    General Public License as published by the Free Software Foundation,
+##    either version 3 of the License, or (at your option) any later version.
+##
+##    DPRL CROHME 2013 is distributed in the hope that it will be useful,
+##    but WITHOUT ANY WARRANTY; without even the implied warranty of
+##    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##    GNU General Public License for more details.
+##
+##    You should have received a copy of the GNU General Public License
+##    along with DPRL CROHME 2013.
+##    If not, see <http://www.gnu.org/licenses/>.
+##
+##    Contact:
+##        - Lei Hu: lei.hu@rit.edu
+##        - Kenny Davila: kxd7282@rit.edu
+##        - Francisco Alvaro: falvaro@dsic.upv.es
+##        - Richard Zanibbi: rlaz@cs.rit.edu
+
+
+import numpy as np
+
+## segment pairs tested together in the narrow phase, bounds the memory of a test
+SEGMENT_BLOCK_SIZE = 1 << 16
+
+
+## broad phase: the pairs (i, j), i < j, of axis aligned boxes that overlap or touch, found with a
+## sort and sweep along x, mins and maxs are (n, 2) arrays with the corners of the boxes
+## returns a (k, 2) array of positions sorted by i and then by j
+def overlapping_box_pairs(mins, maxs):
+        mins = np.asarray(mins, dtype = float).reshape(-1, 2)
+        maxs = np.asarray(maxs, dtype = float).reshape(-1, 2)
+
+        ## sorted by the left side, a box can only overlap along x the boxes after it that start
+        ## before its right side
+        order = np.argsort(mins[:,0], kind = 'mergesort')
+        sorted_left = mins[order,0]
+        ends = np.searchsorted(sorted_left, maxs[order,0], side = 'right')
+        counts = np.maximum(ends - np.arange(len(order)) - 1, 0)
+
+        ## every pair of a box with the boxes it can overlap, as positions in the sorted order
+        first = np.repeat(np.arange(len(order)), counts)
+        second = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + first + 1
+        i, j = order[first], order[second]
+
+        overlap = (mins[i,0] <= maxs[j,0]) & (maxs[i,0] >= mins[j,0]) & (mins[i,1] <= maxs[j,1]) & (maxs[i,1] >= mins[j,1])
+        pairs = np.sort(np.column_stack([i[overlap], j[overlap]]), axis = 1)
+        return pairs[np.lexsort((pairs[:,1], pairs[:,0]))]
+
+
+## the pairs of strokes whose bounding boxes overlap (Stroke.bb_intersects), in the order
+## itertools.combinations(strokes, 2) gives them
+def overlapping_stroke_pairs(strokes):
+        strokes = list(strokes)
+        if len(strokes) < 2:
+                return []
+        mins = [s.extents[0][:2] for s in strokes]
+        maxs = [s.extents[1][:2] for s in strokes]
+        return [(strokes[i], strokes[j]) for i, j in overlapping_box_pairs(mins, maxs).tolist()]
+
+
+## narrow phase: which of the segments (s1, s2), (o1, o2) given as rows of the four (k, 2) arrays
+## cross, the test of Stroke.intersects with the z components of the cross products computed as
+## np.cross does, only a strict change of side on both segments counts
+def segments_cross(s1, s2, o1, o2):
+        s = s2 - s1
+        v1 = (o1[:,0] - s1[:,0])*s[:,1] - (o1[:,1] - s1[:,1])*s[:,0]
+        v2 = (o2[:,0] - s1[:,0])*s[:,1] - (o2[:,1] - s1[:,1])*s[:,0]
+        o = o2 - o1
+        w1 = (s1[:,0] - o1[:,0])*o[:,1] - (s1[:,1] - o1[:,1])*o[:,0]
+        w2 = (s2[:,0] - o1[:,0])*o[:,1] - (s2[:,1] - o1[:,1])*o[:,0]
+        return (v1*v2 < 0) & (w1*w2 < 0)
+
+
+## the segments of a list of polylines (arrays with one point per row): the rows of the start and
+## the end points of every segment in one array of points, padded with zeros to the widest polyline,
+## and the polyline and the width (number of columns) of every segment
+def polyline_segments(polylines):
+        width = max(points.shape[1] for points in polylines)
+        points = np.concatenate([np.hstack([p, np.zeros((len(p), width - p.shape[1]))]) for p in polylines])
+        segment_nums = np.array([len(p) - 1 for p in polylines])
+        ## the last point of a polyline starts no segment
+        starts = np.delete(np.arange(len(points)), np.cumsum(segment_nums + 1) - 1)
+        groups = np.repeat(np.arange(len(polylines)), segment_nums)
+        widths = np.repeat([p.shape[1] for p in polylines], segment_nums)
+        return points, starts, groups, widths
+
+
+## the pairs (i, j) of a segment i of the first side and a segment j of the second side of the same
+## group (polyline pair) whose bounding boxes overlap or touch, only these can share an end point or
+## cross. The segments of each side are swept by group and then by their left side: a segment is
+## paired with the segments of the other side that start between its left and right sides (after
+## its left side for the second side, so that a pair is found once). The pairs are given in blocks
+## of about block_size pairs, and only the pairs of a block are held in memory at a time
+def overlapping_segment_blocks(groups_1, mins_1, maxs_1, groups_2, mins_2, maxs_2, block_size = SEGMENT_BLOCK_SIZE):
+        ## the x coordinates are replaced by their ranks, (group, rank) is then one exact integer key
+        values = np.unique(np.concatenate([mins_1[:,0], maxs_1[:,0], mins_2[:,0], maxs_2[:,0]]))
+        def key(groups, x):
+                return groups.astype(np.int64)*len(values) + np.searchsorted(values, x)
+
+        sides = []
+        for groups, mins in [(groups_1, mins_1), (groups_2, mins_2)]:
+                keys = key(groups, mins[:,0])
+                order = np.argsort(keys, kind = 'mergesort')
+                sides.append((order, keys[order]))
+
+        for a, b, first_side in [(0, 1, 'left'), (1, 0, 'right')]:
+                groups_a, mins_a, maxs_a = [(groups_1, mins_1, maxs_1), (groups_2, mins_2, maxs_2)][a]
+                mins_b, maxs_b = [(mins_1, maxs_1), (mins_2, maxs_2)][b]
+                order_b, keys_b = sides[b]
+                low = np.searchsorted(keys_b, key(groups_a, mins_a[:,0]), side = first_side)
+                high = np.searchsorted(keys_b, key(groups_a, maxs_a[:,0]), side = 'right')
+                counts = np.maximum(high - low, 0)
+                ends = np.cumsum(counts)
+
+                start = 0
+                while start < len(counts):
+                        ## the segments whose pairs fill the block, at least one
+                        stop = max(start + 1, np.searchsorted(ends, ends[start] - counts[start] + block_size, side = 'right'))
+                        block_counts = counts[start:stop]
+                        segment_a = np.repeat(np.arange(start, stop), block_counts)
+                        position = np.arange(block_counts.sum()) - np.repeat(np.cumsum(block_counts) - block_counts, block_counts) + np.repeat(low[start:stop], block_counts)
+                        segment_b = order_b[position]
+                        overlap = (mins_a[segment_a,1] <= maxs_b[segment_b,1]) & (maxs_a[segment_a,1] >= mins_b[segment_b,1])
+                        if a == 0:
+                                yield segment_a[overlap], segment_b[overlap]
+                        else:
+                                yield segment_b[overlap], segment_a[overlap]
+                        start = stop
+
+
+## whether two polylines, given as arrays with one point per row, touch (Stroke.intersects)
+def polylines_intersect(points_1, points_2):
+        return bool(polyline_pairs_intersect([(points_1, points_2)])[0])
+
+
+## whether each pair of polylines touches: two of their segments share an end point or cross.
+## The segments of all the pairs are swept at once (overlapping_segment_blocks), the end points
+## are compared as a whole, as the tuples of Stroke.points are, and the crossings are tested with
+## segments_cross
+## returns a boolean array with one value per pair
+def polyline_pairs_intersect(polyline_pairs, block_size = SEGMENT_BLOCK_SIZE):
+        polyline_pairs = [(np.asarray(points_1, dtype = float), np.asarray(points_2, dtype = float)) for points_1, points_2 in polyline_pairs]
+        result = np.zeros(len(polyline_pairs), dtype = bool)
+        ## a polyline of a single point has no segment
+        tested = [k for k, (points_1, points_2) in enumerate(polyline_pairs) if len(points_1) >= 2 and len(points_2) >= 2]
+        if not tested:
+                return result
+
+        sides = []
+        for side in range(2):
+                points, starts, groups, widths = polyline_segments([polyline_pairs[k][side] for k in tested])
+                first, second = points[starts], points[starts + 1]
+                sides.append((first, second, groups, widths, np.minimum(first[:,:2], second[:,:2]), np.maximum(first[:,:2], second[:,:2])))
+        (s1, s2, groups_1, widths_1, mins_1, maxs_1), (o1, o2, groups_2, widths_2, mins_2, maxs_2) = sides
+
+        touching = np.zeros(len(tested), dtype = bool)
+        for i, j in overlapping_segment_blocks(groups_1, mins_1, maxs_1, groups_2, mins_2, maxs_2, block_size):
+                ## the pairs already known to touch need no more test
+                keep = ~touching[groups_1[i]]
+                i, j = i[keep], j[keep]
+                shared = np.zeros(len(i), dtype = bool)
+                for s in [s1[i], s2[i]]:
+                        for o in [o1[j], o2[j]]:
+                                shared |= (s == o).all(axis = 1)
+                shared &= widths_1[i] == widths_2[j]
+                crossing = segments_cross(s1[i,:2], s2[i,:2], o1[j,:2], o2[j,:2])
+                touching[groups_1[i][shared | crossing]] = True
+
+        result[tested] = touching
+        return result
+
+
+## the stroke pairs that touch, one boolean per pair as [s1.intersects(s2) for s1, s2 in pairs]
+def intersecting_stroke_pairs(stroke_pairs):
+        return polyline_pairs_intersect([(s1.array, s2.array) for s1, s2 in stroke_pairs])
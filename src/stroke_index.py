@@ -0,0 +1,268 @@
+##    DPRL CROHME 2013
+##    Copyright (c) 2013-2014 Lei Hu, Kenny Davila, Francisco Alvaro, Richard Zanibbi
+##
+##    This file is part of DPRL CROHME 2013.
+##
+##    DPRL CROHME 2013 is free software:
+##    you can redistribute it and/or modify it under the terms of the GNU
+##    General Public License as published by the Free Software Foundation,
+##    either version 3 of the License, or (at your option) any later version.
+##
+##    DPRL CROHME 2013 is distributed in the hope that it will be useful,
+##    but WITHOUT ANY WARRANTY; without even the implied warranty of
+##    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##    GNU General Public License for more details.
+##
+##    You should have received a copy of the GNU General Public License
+##    along with DPRL CROHME 2013.
+##    If not, see <http://www.gnu.org/licenses/>.
+##
+##    Contact:
+##        - Lei Hu: lei.hu@rit.edu
+##        - Kenny Davila: kxd7282@rit.edu
+##        - Francisco Alvaro: falvaro@dsic.upv.es
+##        - Richard Zanibbi: rlaz@cs.rit.edu
+
+
+import numpy as np
+from scipy.spatial import cKDTree
+import shape_context
+import convex
+
+## number of neighbors asked for each point of the reference stroke in the first search, it is
+## doubled until the nearest strokes are known for sure
+FIRST_NEIGHBOR_NUM = 16
+
+## relative error allowed for the distances of the KD-tree
+DISTANCE_TOLERANCE = 1e-9
+
+## largest number of point distances computed at once, the distances between two point sets
+## are computed a block of rows at a time so that two long strokes never need their whole
+## distance matrix
+DISTANCE_BLOCK_SIZE = 1 << 16
+
+## point sets with more point pairs than this look for their closest points with a KD-tree and
+## for their farest points among the points on their convex hulls
+LARGE_PAIR_NUM = 1 << 14
+
+
+## check that the strokes kept in id order in stroke_list are exactly the strokes of the stroke
+## dictionary of an equation, preprocessing replaces the stroke objects of an equation and what
+## was built from the old ones has to be built again then
+def same_strokes(ids, stroke_list, strokes):
+        if len(strokes) != len(stroke_list):
+                return False
+        for id, s in zip(ids, stroke_list):
+                if strokes.get(id) is not s:
+                        return False
+        return True
+
+
+## minimum and maximum distances between the points of two (n, 2) arrays, the same values as
+## Stroke.closest_distance and Stroke.farest_distance
+def point_set_distances(points_1, points_2):
+        if len(points_1)*len(points_2) > LARGE_PAIR_NUM:
+                return closest_point_distance(points_1, points_2), farest_point_distance(points_1, points_2)
+        blocks = [(dist.min(), dist.max()) for dist in point_distance_blocks(points_1, points_2)]
+        return float(min(b[0] for b in blocks)), float(max(b[1] for b in blocks))
+
+
+## the distances between the points of two arrays, one block of rows of the distance matrix at a time
+def point_distance_blocks(points_1, points_2, block_size = DISTANCE_BLOCK_SIZE):
+        row_num = max(1, block_size // max(1, len(points_2)))
+        for start in range(0, len(points_1), row_num):
+                rows = points_1[start:start + row_num]
+                dx = rows[:,0,np.newaxis] - points_2[:,0]
+                dy = rows[:,1,np.newaxis] - points_2[:,1]
+                yield shape_context.point_distance(dx, dy)
+
+
+## minimum distance between the points of two arrays
+def closest_point_distance(points_1, points_2):
+        if len(points_1)*len(points_2) > LARGE_PAIR_NUM:
+                return kd_tree_closest_distance(points_1, points_2)
+        return float(min(dist.min() for dist in point_distance_blocks(points_1, points_2)))
+
+
+## maximum distance between the points of two arrays, the farest pair is a pair of points on the
+## convex hulls of the two sets
+def farest_point_distance(points_1, points_2):
+        if len(points_1)*len(points_2) > LARGE_PAIR_NUM:
+                points_1 = hull_points(points_1)
+                points_2 = hull_points(points_2)
+        return float(max(dist.max() for dist in point_distance_blocks(points_1, points_2)))
+
+
+## minimum distance between the points of two arrays with a KD-tree of the larger set, the other
+## set is searched a block at a time for points closer than the closest pair found so far
+## the distances of the tree are only used to find the closest pairs, their distances are computed
+## again as point_distance does
+def kd_tree_closest_distance(points_1, points_2, block_size = 256):
+        if len(points_1) > len(points_2):
+                points_1, points_2 = points_2, points_1
+        points_1 = points_1[:,:2]
+        points_2 = points_2[:,:2]
+        tree = cKDTree(points_2)
+        nearest = np.empty(len(points_1))
+        best = np.inf
+        for start in range(0, len(points_1), block_size):
+                nearest[start:start + block_size] = tree.query(points_1[start:start + block_size], distance_upper_bound = best*(1 + DISTANCE_TOLERANCE))[0]
+                best = min(best, nearest[start:start + block_size].min())
+                if best == 0:
+                        return 0.0
+
+        ## every pair whose distance in the tree is close enough to the minimum
+        bound = best*(1 + DISTANCE_TOLERANCE)
+        candidates = np.flatnonzero(nearest <= bound)
+        closest = np.inf
+        for i, neighbors in zip(candidates, tree.query_ball_point(points_1[candidates], bound)):
+                if not neighbors:
+                        continue
+                dist = shape_context.point_distance(points_1[i,0] - points_2[neighbors,0], points_1[i,1] - points_2[neighbors,1])
+                closest = min(closest, dist.min())
+        return float(closest)
+
+
+## the points of an array that can be the farest from another point: the points on its convex hull,
+## with some tolerance for the rounding of the hull, any point inside the hull has a point of the
+## hull farther from any other point
+def hull_points(points, block_size = DISTANCE_BLOCK_SIZE):
+        points = points[:,:2]
+        points = points[np.lexsort((points[:,1], points[:,0]))]
+        points = points[np.concatenate([[True], (np.diff(points, axis = 0) != 0).any(axis = 1)])]
+        if len(points) < 3:
+                return points
+        hull = np.array(convex.convexHull(map(tuple, points.tolist())))
+        if len(hull) < 3:
+                return points
+
+        ## distance of the points to the lines of the hull edges, positive inside the hull
+        edges = np.roll(hull, -1, axis = 0) - hull
+        orientation = np.sign(np.sum(hull[:,0]*edges[:,1] - hull[:,1]*edges[:,0]))
+        edge_lengths = np.sqrt(edges[:,0]*edges[:,0] + edges[:,1]*edges[:,1])
+        margin = DISTANCE_TOLERANCE*(1 + np.abs(points).max())
+        keep = np.empty(len(points), dtype = bool)
+        row_num = max(1, block_size // len(hull))
+        for start in range(0, len(points), row_num):
+                rows = points[start:start + row_num]
+                inside = orientation*(edges[:,0]*(rows[:,1,np.newaxis] - hull[:,1]) - edges[:,1]*(rows[:,0,np.newaxis] - hull[:,0]))/edge_lengths
+                keep[start:start + row_num] = inside.min(axis = 1) <= margin
+        return points[keep]
+
+
+## minimum and maximum point distances of the stroke pairs of an expression, each pair is computed
+## the first time it is asked for and kept in a symmetric matrix stored as its upper triangle
+## strokes that are not strokes of the expression are computed every time
+class StrokeDistanceCache(object):
+        def __init__(self, strokes):
+                ## strokes is the stroke dictionary of an equation, the strokes are kept in id order
+                self.ids = sorted(strokes.keys())
+                self.strokes = [strokes[id] for id in self.ids]
+                self.position = dict((id, i) for i, id in enumerate(self.ids))
+                self.points = [s.array[:,:2] for s in self.strokes]
+                stroke_num = len(self.strokes)
+                self.closest = np.empty(stroke_num*(stroke_num + 1)//2)
+                self.closest.fill(np.nan)
+                self.farest = self.closest.copy()
+                self.hits = 0
+                self.misses = 0
+
+        def indexes(self, strokes):
+                return same_strokes(self.ids, self.strokes, strokes)
+
+        def closest_distance(self, stroke_1, stroke_2):
+                return self.distances(stroke_1, stroke_2)[0]
+
+        def farest_distance(self, stroke_1, stroke_2):
+                return self.distances(stroke_1, stroke_2)[1]
+
+        ## (minimum distance, maximum distance) between the points of the two strokes
+        def distances(self, stroke_1, stroke_2):
+                i = self.stroke_position(stroke_1)
+                j = self.stroke_position(stroke_2)
+                if i is None or j is None:
+                        self.misses += 1
+                        return point_set_distances(stroke_1.array, stroke_2.array)
+
+                ## position of the pair in the upper triangle, row by row
+                i, j = min(i, j), max(i, j)
+                k = i*len(self.strokes) - i*(i - 1)//2 + (j - i)
+                if np.isnan(self.closest[k]):
+                        self.misses += 1
+                        self.closest[k], self.farest[k] = point_set_distances(self.points[i], self.points[j])
+                else:
+                        self.hits += 1
+                return float(self.closest[k]), float(self.farest[k])
+
+        ## the position of a stroke of the expression, None for any other stroke
+        def stroke_position(self, stroke):
+                i = self.position.get(stroke.id)
+                if i is None or self.strokes[i] is not stroke:
+                        return None
+                return i
+
+
+## KD-tree over the points of the strokes of an expression, every point is labelled with the
+## position of its stroke, used to find the strokes nearest to a stroke by their minimum point
+## distance without comparing it with every point of every stroke
+class StrokeIndex(object):
+        def __init__(self, strokes, distance_cache = None):
+                ## strokes is the stroke dictionary of an equation, the strokes are kept in id order
+                ## the exact distances of the strokes found come from distance_cache
+                self.ids = sorted(strokes.keys())
+                self.strokes = [strokes[id] for id in self.ids]
+                if distance_cache is None:
+                        distance_cache = StrokeDistanceCache(strokes)
+                self.distance_cache = distance_cache
+                point_lists = [s.array[:,:2] for s in self.strokes]
+                self.points = np.concatenate(point_lists) if point_lists else np.zeros((0, 2))
+                self.labels = np.repeat(np.arange(len(self.strokes)), [len(p) for p in point_lists])
+                self.tree = cKDTree(self.points) if len(self.points) else None
+
+        def indexes(self, strokes):
+                return same_strokes(self.ids, self.strokes, strokes)
+
+        ## the k strokes nearest to the given stroke as a list of (minimum distance, stroke id),
+        ## sorted by distance and then by id, the strokes with an id in exclude are skipped
+        def nearest_strokes(self, stroke, k, exclude = ()):
+                points = stroke.array[:,:2]
+                excluded = [i for i, id in enumerate(self.ids) if id in exclude]
+                k = min(k, len(self.strokes) - len(excluded))
+                if k <= 0 or len(points) == 0 or self.tree is None:
+                        return []
+
+                point_num = len(self.points)
+                neighbor_num = min(FIRST_NEIGHBOR_NUM, point_num)
+                while True:
+                        dist, index = self.tree.query(points, neighbor_num)
+                        dist = dist.reshape(len(points), -1)
+                        index = index.reshape(len(points), -1)
+
+                        ## every point closer than the farthest neighbor found for its reference point
+                        ## has been found, so every stroke closer than bound is found
+                        if neighbor_num < point_num:
+                                bound = dist[:,-1].min()
+                        else:
+                                bound = np.inf
+                        found = dist < bound
+                        stroke_dist = np.empty(len(self.strokes))
+                        stroke_dist.fill(np.inf)
+                        np.minimum.at(stroke_dist, self.labels[index[found]], dist[found])
+                        stroke_dist[excluded] = np.inf
+
+                        known = np.flatnonzero(stroke_dist < bound)
+                        if len(known) >= k or neighbor_num == point_num:
+                                ## the tree may be one ulp away from distance(), so the distances of the
+                                ## strokes found are computed again, and the search goes on when the k-th
+                                ## one is too close to the bound to be sure about the strokes left out
+                                nearest = sorted((self.distance_cache.closest_distance(stroke, self.strokes[i]), self.ids[i]) for i in known)[:k]
+                                if nearest[-1][0] < bound*(1 - DISTANCE_TOLERANCE) or neighbor_num == point_num:
+                                        return nearest
+                        neighbor_num = min(2*neighbor_num, point_num)
+
+        ## the id of the stroke nearest to the given stroke, other than the ones equal to it,
+        ## or -1 if there is no other stroke
+        def nearest_other_stroke(self, stroke):
+                exclude = set(id for id, s in zip(self.ids, self.strokes) if s == stroke)
+                nearest = self.nearest_strokes(stroke, 1, exclude)
+                return nearest[0][1] if nearest else -1
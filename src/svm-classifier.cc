@@ -29,22 +29,33 @@
 
 using namespace std;
 
-SVMclass::SVMclass(char *p2model) {
+SVMclass::SVMclass(const char *p2model, bool exitOnError) {
+  NC=0;
+
   if((model=svm_load_model(p2model))==0) {
     fprintf(stderr,"Error: Abriendo modelo SVM '%s'\n", p2model);
-    exit(-1);
+    if( exitOnError ) exit(-1);
+    return;
   }
 
   if(svm_check_probability_model(model)==0) {
     fprintf(stderr,"Error: SVM model does not support probabiliy estimates\n");
-    exit(-1);
+    svm_free_and_destroy_model(&model);
+    model=0;
+    if( exitOnError ) exit(-1);
+    return;
   }
 
   NC=svm_get_nr_class(model);
 }
 
 SVMclass::~SVMclass() {
-  svm_free_and_destroy_model(&model);
+  if( model )
+    svm_free_and_destroy_model(&model);
+}
+
+bool SVMclass::isLoaded() {
+  return model != 0;
 }
 
 int SVMclass::classify(svm_node *x, double *probs) {
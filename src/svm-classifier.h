@@ -39,9 +39,11 @@ class SVMclass{
   int NC;
 
  public:
-  SVMclass(char *p2model);
+  SVMclass(const char *p2model, bool exitOnError=true);
   ~SVMclass();
 
+  bool isLoaded();
+
   int classify(svm_node *x, double *probs);
 };
 
@@ -29,33 +29,83 @@
 
 using namespace std;
 
+//Empty symbol, to be read with load()
+symbol::symbol() {
+  strks = NULL;
+  NS = 0;
+}
+
 symbol::symbol(char *path) {
+  strks = NULL;
+  NS = 0;
+
   FILE *fd = fopen(path, "r");
   if( !fd ) {
     fprintf(stderr, "Error loading file '%s'\n", path);
     exit(-1);
   }
 
+  if( !load(fd) ) {
+    fprintf(stderr, "Error reading symbol '%s'\n", path);
+    exit(-1);
+  }
+
+  fclose(fd);
+}
+
+//Read a symbol: its label, the number of strokes and, for every stroke,
+//the number of points followed by their coordinates. Returns false when
+//the input ends before the whole symbol is read, so that several symbols
+//can be read one after the other from the same stream
+bool symbol::load(FILE *fd) {
   //Symbol class
   char line[2048];
-  fscanf(fd, "%s", line);
+  if( fscanf(fd, "%2047s", line) != 1 ) return false;
   label = line;
 
   setType();
-  
+
   //Number of strokes
-  fscanf(fd, "%d", &NS);
-  strks = new point*[NS];
+  int ns;
+  if( fscanf(fd, "%d", &ns) != 1 || ns < 0 ) return false;
+  strks = new point*[ns];
 
-  for(int i=0; i<NS; i++) {
+  for(NS=0; NS<ns; NS++) {
     //Number of points
     int NP;
-    fscanf(fd, "%d", &NP);
-    strks[i] = new point[NP+1];
-    strks[i][0].x = NP;
+    if( fscanf(fd, "%d", &NP) != 1 || NP < 0 ) return false;
+    strks[NS] = new point[NP+1];
+    strks[NS][0].x = NP;
 
     for(int j=1; j<=NP; j++)
-      fscanf(fd, "%f %f", &strks[i][j].x, &strks[i][j].y);
+      if( fscanf(fd, "%f %f", &strks[NS][j].x, &strks[NS][j].y) != 2 ) {
+        NS++;
+        return false;
+      }
+  }
+
+  computeBB();
+  return true;
+}
+
+//Build a symbol from memory: np[i] points for stroke i, with
+//the (x,y) coordinates of all the strokes one after the other in xy
+symbol::symbol(const char *lab, int ns, const int *np, const float *xy) {
+  label = lab;
+
+  setType();
+
+  NS = ns;
+  strks = new point*[NS];
+
+  for(int i=0; i<NS; i++) {
+    strks[i] = new point[np[i]+1];
+    strks[i][0].x = np[i];
+
+    for(int j=1; j<=np[i]; j++) {
+      strks[i][j].x = *xy++;
+      strks[i][j].y = *xy++;
+    }
   }
 
   computeBB();
@@ -54,9 +54,12 @@ struct symbol{
   float cen; //Vertical center
   char type;
 
+  symbol();
   symbol(char *path);
+  symbol(const char *lab, int ns, const int *np, const float *xy);
   ~symbol();
 
+  bool load(FILE *fd);
   void computeBB();
   void BBfeatures( symbol *sym, svm_node *sample );
   void setType();
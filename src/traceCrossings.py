@@ -0,0 +1,121 @@
+##    DPRL CROHME 2013
+##    Copyright (c) 2013-2014 Lei Hu, Kenny Davila, Francisco Alvaro, Richard Zanibbi
+##
+##    This file is part of DPRL CROHME 2013.
+##
+##    DPRL CROHME 2013 is free software: 
+##    you can redistribute it and/or modify it under the terms of the GNU 
+##    General Public License as published by the Free Software Foundation, 
+##    either version 3 of the License, or (at your option) any later version.
+##
+##    DPRL CROHME 2013 is distributed in the hope that it will be useful,
+##    but WITHOUT ANY WARRANTY; without even the implied warranty of
+##    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##    GNU General Public License for more details.
+##
+##    You should have received a copy of the GNU General Public License
+##    along with DPRL CROHME 2013.  
+##    If not, see <http://www.gnu.org/licenses/>.
+##
+##    Contact:
+##        - Lei Hu: lei.hu@rit.edu
+##        - Kenny Davila: kxd7282@rit.edu
+##        - Francisco Alvaro: falvaro@dsic.upv.es
+##        - Richard Zanibbi: rlaz@cs.rit.edu 
+
+
+import numpy as np
+
+#This class finds the points at which lines cross the segments of a set of 
+#traces, all the lines and all the segments are intersected at once and the
+#crossings of each line are the same, in the same order, as those given by
+#TraceInfo.getLineCrossings for each trace in turn
+
+class TraceCrossings:
+
+    def __init__(self, traces):
+        self.traces = traces
+
+        #the segments of all the traces, one after the other...
+        starts = []
+        ends = []
+        trace_index = []
+        for i, trace in enumerate(traces):
+            points = np.array(trace.points, dtype=float).reshape(-1, 2)
+            starts.append( points[:-1] )
+            ends.append( points[1:] )
+            trace_index.append( np.repeat(i, len(points[1:])) )
+
+        starts = np.concatenate( starts ) if len(starts) > 0 else np.zeros((0, 2))
+        ends = np.concatenate( ends ) if len(ends) > 0 else np.zeros((0, 2))
+        self.trace_index = np.concatenate( trace_index ).astype(int) if len(trace_index) > 0 else np.zeros(0, dtype=int)
+        self.s_x1, self.s_y1 = starts[:, 0], starts[:, 1]
+        self.s_x2, self.s_y2 = ends[:, 0], ends[:, 1]
+
+        #...and the boundaries of each trace, as getLineCrossings checks them
+        self.boundaries = np.array( [ trace.getBoundaries() for trace in traces ], dtype=float ).reshape(-1, 4)
+
+    #the crossings of every line, a list of (x, y) points per line
+    def getLinesCrossings(self, lines):
+        lines = np.array(lines, dtype=float).reshape(-1, 4)
+        l_x1, l_y1, l_x2, l_y2 = lines[:, 0], lines[:, 1], lines[:, 2], lines[:, 3]
+        l_xmin, l_xmax = np.minimum(l_x1, l_x2), np.maximum(l_x1, l_x2)
+        l_ymin, l_ymax = np.minimum(l_y1, l_y2), np.maximum(l_y1, l_y2)
+
+        #only the traces whose boxes overlap the box of the line, and never
+        #with a line that is a single point
+        minX, maxX, minY, maxY = [ self.boundaries[:, k] for k in range(4) ]
+        overlap = (minX < l_xmax[:, np.newaxis]) & (maxX > l_xmin[:, np.newaxis]) & \
+                  (minY < l_ymax[:, np.newaxis]) & (maxY > l_ymin[:, np.newaxis])
+        overlap &= ~((l_x1 == l_x2) & (l_y1 == l_y2))[:, np.newaxis]
+
+        #every pair of a line with a segment of those traces, by line and then
+        #by segment
+        line, segment = np.nonzero( overlap[:, self.trace_index] )
+        l_x1, l_y1, l_x2, l_y2 = l_x1[line], l_y1[line], l_x2[line], l_y2[line]
+        l_xmin, l_xmax, l_ymin, l_ymax = l_xmin[line], l_xmax[line], l_ymin[line], l_ymax[line]
+        s_x1, s_y1 = self.s_x1[segment], self.s_y1[segment]
+        s_x2, s_y2 = self.s_x2[segment], self.s_y2[segment]
+        s_xmin, s_xmax = np.minimum(s_x1, s_x2), np.maximum(s_x1, s_x2)
+        s_ymin, s_ymax = np.minimum(s_y1, s_y2), np.maximum(s_y1, s_y2)
+
+        vertical_line = l_x1 == l_x2
+        vertical_segment = s_x2 == s_x1
+
+        #the values of the branches that do not apply are discarded
+        with np.errstate(divide='ignore', invalid='ignore'):
+            l_m = (l_y2 - l_y1) / (l_x2 - l_x1)
+            l_b = l_y1 - l_m * l_x1
+            s_m = (s_y2 - s_y1) / (s_x2 - s_x1)
+            s_b = s_y1 - s_m * s_x1
+
+            #line against a vertical segment
+            y_vertical_segment = s_x1 * l_m + l_b
+            #not parallel, they must have an intersection point
+            x_int = (s_b - l_b) / (l_m - s_m)
+            y_int = x_int * l_m + l_b
+            #vertical line against a segment that is not
+            y_vertical_line = l_x1 * s_m + s_b
+
+            parallel = s_m == l_m
+            found = np.where(vertical_line,
+                             np.where(vertical_segment,
+                                      (s_x1 == l_x1) & (s_ymin < l_ymax) & (l_ymin < s_ymax),
+                                      (s_xmin <= l_x1) & (l_x1 <= s_xmax) & (l_ymin <= y_vertical_line) & (y_vertical_line <= l_ymax)),
+                             np.where(vertical_segment,
+                                      (l_xmin <= s_x1) & (s_x1 <= l_xmax) & (s_ymin <= y_vertical_segment) & (y_vertical_segment <= s_ymax),
+                                      np.where(parallel,
+                                               (l_b == s_b) & (l_xmin <= s_xmax) & (s_xmin <= l_xmax),
+                                               (l_xmin <= x_int) & (x_int <= l_xmax) & (s_xmin <= x_int) & (x_int <= s_xmax))))
+
+        #parallel segments on the line give their middle point
+        middle = (vertical_line & vertical_segment) | (~vertical_line & ~vertical_segment & parallel)
+        x = np.where(middle, (s_x1 + s_x2) / 2.0,
+                     np.where(vertical_line, l_x1, np.where(vertical_segment, s_x1, x_int)))
+        y = np.where(middle, (s_y1 + s_y2) / 2.0,
+                     np.where(vertical_line, y_vertical_line, np.where(vertical_segment, y_vertical_segment, y_int)))
+
+        #split the crossings found by line
+        points = list(zip(x[found].tolist(), y[found].tolist()))
+        ends = np.cumsum( np.bincount(line[found], minlength=len(lines)) ).tolist()
+        return [ points[start:end] for start, end in zip([0] + ends[:-1], ends) ]
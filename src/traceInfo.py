@@ -24,15 +24,17 @@
 ##        - Richard Zanibbi: rlaz@cs.rit.edu 
 
 import math
+import numpy as np
 
 #References to papers for the original methods....
 #[1] - Preprocessing Techniques for Online Handwriting Recognition,
 #      B.Q. Huang and Y.B. Zhang and M-T. Kechadi
 
 #This class represents a traces, and also performs all the operations
-#relative to it
+#relative to it. The points are kept in a (n, 2) array, the list of point
+#tuples is only built when it is asked for
 
-class TraceInfo:    
+class TraceInfo(object):
     
     def __init__(self, trace_id, trace_points):
         self.id = trace_id
@@ -41,6 +43,27 @@ class TraceInfo:
         self.bounding_box = None
         self.segments = None
 
+    #the points as a list of (x, y) tuples
+    @property
+    def points(self):
+        if self._points is None:
+            self._points = map(tuple, self.array.tolist())
+        return self._points
+
+    #points can be a list of tuples or an array with one point per row
+    @points.setter
+    def points(self, points):
+        self.array = np.array(points, dtype=float).reshape(len(points), -1) if len(points) else np.zeros((0, 2))
+        self._points = None
+
+    #a copy of the trace that can be changed (relocated) without changing this one
+    def copy(self):
+        new_trace = TraceInfo(self.id, self.array)
+        new_trace.sharp_points = list(self.sharp_points) if self.sharp_points is not None else None
+        new_trace.bounding_box = self.bounding_box
+        new_trace.segments = list(self.segments) if self.segments is not None else None
+        return new_trace
+
     #Gets current boundaries for the trace
     def getBoundaries(self):
         #only compute if it has never been computer or if it has changed...
@@ -66,13 +89,7 @@ class TraceInfo:
             
     #Checks for duplicated points
     def hasDuplicatedPoints(self):
-        duplicated = False
-        for i in range(len(self.points) - 1):
-            for j in range(i + 1, len(self.points)):
-                if self.points[i][0] == self.points[j][0] and \
-                   self.points[i][1] == self.points[j][1]:
-                    duplicated = True
-        return duplicated
+        return len(set(self.points)) < len(self.points)
 
     #Convert to string representation
     def __str__(self):
@@ -84,85 +101,133 @@ class TraceInfo:
         return result
 
     #remove duplicated points (pre processing)
+    #a point is removed when it is equal to a point kept before it and no point
+    #kept between them is further than a tenth of the diagonal from that one,
+    #only the points found more than once need to be checked
     def removeDuplicatedPoints(self):
 
         minX, maxX, minY, maxY = self.getBoundaries()
         w = maxX - minX
         h = maxY - minY
         diagonal = math.sqrt( w * w + h * h )
-        
-        i = 0
-        while i < len(self.points):
-            j = i + 1
-            while j < len(self.points):
-                if self.distance(i, j) > diagonal * 0.1:
+
+        points = self.points
+        positions = {}
+        ranks = []
+        for i, p in enumerate(points):
+            if p in positions:
+                ranks.append(len(positions[p]))
+                positions[p].append(i)
+            else:
+                ranks.append(0)
+                positions[p] = [i]
+
+        removed = np.zeros(len(points), dtype=bool)
+        for i in range(len(points)):
+            copies = positions[points[i]]
+            if removed[i] or copies[-1] == i:
+                continue
+
+            #the first point kept that is too far away ends the search, it is
+            #searched in blocks of growing size, up to the last copy at most...
+            end = len(points)
+            start = i + 1
+            size = 16
+            while start <= copies[-1]:
+                stop = min(start + size, copies[-1] + 1)
+                far = ~removed[start:stop] & (self.pointDistances(i, start, stop) > diagonal * 0.1)
+                if far.any():
+                    end = start + np.argmax(far)
                     break
-                
-                if self.points[i] == self.points[j]:
-                    del self.points[j]
-                else:
-                    j += 1
-            i += 1            
+                start = stop
+                size *= 2
+
+            #...the copies after it and before that point are removed
+            k = ranks[i] + 1
+            while k < len(copies) and copies[k] < end:
+                removed[copies[k]] = True
+                k += 1
+
+        if removed.any():
+            self.points = self.array[~removed]
     
     #Add points where there are missing points (pre processing)
     def addMissingPoints(self):
         #to avoid problems....
         self.removeDuplicatedPoints()
+
+        points = self.points
+        lengths = self.segmentLengths().tolist()
         
         #calculate Le (average segment length) as defined in [1]
         Le = 0;
-        for i in range(len(self.points) - 1):
-            Le += self.distance( i, i + 1)
-        Le /= len(self.points)
+        for i in range(len(points) - 1):
+            Le += lengths[i]
+        Le /= len(points)
         
         #the distance used to insert points...
         d = 0.95 * Le
-        i = 0        
-        while i < len(self.points) - 1:
+
+        #the new points, the last one is the point the next is searched from
+        #and the points given start at next_i after it
+        new_points = [ points[0] ]
+        next_i = 1
+        while next_i < len(points):
             #search point to interpolate ...
             n = 1
-            lenght = self.distance(i, i + n)
+            x1, y1 = new_points[-1]
+            x2, y2 = points[next_i]
+            lenght = math.sqrt(math.pow((x1 - x2), 2) + math.pow((y1 - y2), 2))
             sum = 0
             
-            while sum + lenght < d and i + n + 1 < len(self.points):
+            while sum + lenght < d and next_i + n < len(points):
                 n += 1
                 sum += lenght
-                lenght = self.distance(i + n - 1, i + n)
+                lenght = lengths[next_i + n - 2]
                     
             diff = d - sum 
                                     
-            #insert a point between i + n- 1 and i +n at distance diff                                
+            #insert a point between the ones before n and n at distance diff                                
             #use linear interpolation...                                        
             w2 = diff / lenght            
             
+            insert = False
             if w2 < 1.0:
-                xp = self.points[i + n - 1][0] * (1- w2) + self.points[i + n][0] * w2
-                yp = self.points[i + n - 1][1] * (1- w2) + self.points[i + n][1] * w2                  
-                
-                #check for collision with next point...
-                insert = True
-                                                
-                if i + n < len(self.points):
-                    if xp == self.points[i + n][0] and \
-                       yp == self.points[i + n][1]:
-                        #weird case where a point after interpolated falls of the same 
-                        #coordinates as next point, don't insert it
-                        insert = False                                            
-                             
-                                                       
-                if insert:
-                    self.points.insert(i + n, (xp, yp) )                
+                before = points[next_i + n - 2] if n > 1 else new_points[-1]
+                after = points[next_i + n - 1]
+                xp = before[0] * (1- w2) + after[0] * w2
+                yp = before[1] * (1- w2) + after[1] * w2                  
+
+                #weird case where a point after interpolated falls of the same 
+                #coordinates as next point, don't insert it
+                insert = not (xp == after[0] and yp == after[1])
                         
             else:
                 #at the end, no point added but erase the one at the end
                 n += 1
-            
-            #now erase points from i + 1 .. f + n - 1
-            toErase = n - 1
-            for j in range(toErase):
-                del self.points[i + 1]  
-                
-            i += 1        
+
+            #the points before n are erased, the search goes on from the point
+            #inserted or else from the point at n
+            if insert:
+                new_points.append( (xp, yp) )
+                next_i += n - 1
+            else:
+                if next_i + n - 1 < len(points):
+                    new_points.append( points[next_i + n - 1] )
+                next_i += n
+
+        self.points = new_points
+
+    #the distances between the point i and the points from start to end, as
+    #distance computes them
+    def pointDistances(self, i, start, end):
+        differences = self.array[i] - self.array[start:end]
+        return np.sqrt(np.power(differences[:, 0], 2.0) + np.power(differences[:, 1], 2.0))
+
+    #the distances between each point and the next one
+    def segmentLengths(self):
+        differences = self.array[:-1] - self.array[1:]
+        return np.sqrt(np.power(differences[:, 0], 2.0) + np.power(differences[:, 1], 2.0))
         
     #returns the distance between two points in the curve
     def distance(self, i, j):
@@ -220,13 +285,14 @@ class TraceInfo:
     #uses the algorithm defined in [1] to find the sharp points of the trace...
     # returns a list of tuples of the form (index, (x, y))  for all the sharp points
     def getSharpPoints(self):
+        points = self.points
+
         #the first is a sharp point
-        sharpPoints = [ (0, self.points[0]) ]
+        sharpPoints = [ (0, points[0]) ]
         
         #now calculate the slope angles between each pair of consecutive points...
-        alpha = []
-        for i in range(len(self.points) - 1):
-            alpha.append( self.slopeAngle(self.points[i], self.points[i + 1]) )
+        steps = self.array[1:] - self.array[:-1]
+        alpha = np.arctan2(steps[:, 1], steps[:, 0])
             
         #check
         if len(alpha) <= 1:
@@ -235,27 +301,21 @@ class TraceInfo:
             return sharpPoints 
             
         #now detect sharp points...
-        theta = [ (alpha[0] - alpha[1]) ]            
-        for k in range(1, len(self.points) - 1):
-            #use two different tests to detect sharp point...
-            #1) change in writing direction (as defined in [1])
-            #2) difference in writing direction angle between current point and
-            #   and last sharp point higher than a threshold            
-            addPoint = False
-            
-            #for 1) calculate difference in writing direction between 
-            #current point and previous point
-            if (k < len(self.points) - 2):
-                theta.append( alpha[k] - alpha[k + 1] )
-                
-                if theta[k] != 0.0 and k > 0:
-                    delta = theta[k] * theta[k - 1]
-                    
-                    if (delta <= 0.0 and theta[k - 1] != 0.0):
-                        #direction at which the pen is moving has changed                        
-                        addPoint = True
-                
-            #for 2) calculate the difference of angle between 
+        #use two different tests to detect sharp point...
+        #1) change in writing direction (as defined in [1]), the difference in
+        #   writing direction between each point and the next changes its sign
+        theta = alpha[:-1] - alpha[1:]
+        changed = np.zeros(len(points), dtype=bool)
+        changed[1:-2] = (theta[1:] != 0.0) & (theta[1:] * theta[:-1] <= 0.0) & (theta[:-1] != 0.0)
+        changed = changed.tolist()
+
+        #2) difference in writing direction angle between current point and
+        #   and last sharp point higher than a threshold            
+        alpha = alpha.tolist()
+        for k in range(1, len(points) - 1):
+            addPoint = changed[k]
+
+            #calculate the difference of angle between 
             #current point and last sharp point
             phi = self.angularDifference(alpha[sharpPoints[-1][0]], alpha[k])
             
@@ -266,12 +326,11 @@ class TraceInfo:
             if (phi >= math.pi / 8):
                 addPoint = True
                 
-                
             if addPoint:
-                sharpPoints.append( (k, self.points[k] ) )                                    
+                sharpPoints.append( (k, points[k] ) )                                    
 
         #the last point is a sharp point
-        sharpPoints.append( (len(self.points) - 1, self.points[-1]  ) )
+        sharpPoints.append( (len(points) - 1, points[-1]  ) )
         
         return sharpPoints
     
@@ -324,40 +383,50 @@ class TraceInfo:
     
         return (xt, yt)  
 
+    #the points between each pair of consecutive sharp points are computed at
+    #once, with linear interpolation between the first two and the last two
+    #sharp points and with Catmull-Rom between the others
     def splineResample(self, sharp_points, subDivisions):                
-        new_points = []
-        
         self.sharp_points = sharp_points
         
         #check special case: Only one sharp_point
         if len(sharp_points) == 1:
             self.points = [ sharp_points[0][1] ]
             return
-        
-        for i in range(len(sharp_points)):
-            #add the sharp point
-            new_points.append( sharp_points[i][1] )
-            
-            if i < len(sharp_points) - 1:
-                innerPoints = (sharp_points[i + 1][0] - sharp_points[i][0]) * subDivisions
-                tStep = 1.0 / innerPoints
-            
-            #depending on the current range...
-            if i == 0 or i == len(sharp_points) - 2:
-                #between first and second sharp points...
-                # or between the last two sharp points...
-                # use linear interpolation...                                                
-                for k in range(1, innerPoints):
-                    new_points.append(self.lerp(sharp_points[i][1], sharp_points[i + 1][1], tStep * k))
-
-            elif i < len(sharp_points) - 2:                
-                    #in the middle of four sharp points... use Catmull-Rom                
-                    for k in range(1, innerPoints):
-                        new_points.append(self.catmullRom(sharp_points[i - 1][1], sharp_points[i][1], sharp_points[i + 1][1], sharp_points[i + 2][1], tStep * k))
+
+        indices = np.array( [ index for index, point in sharp_points ] )
+        sharp_x = np.array( [ point[0] for index, point in sharp_points ], dtype=float )
+        sharp_y = np.array( [ point[1] for index, point in sharp_points ], dtype=float )
+
+        #the range between the sharp points i and i + 1 gets innerPoints - 1 points...
+        innerPoints = (indices[1:] - indices[:-1]) * subDivisions
+        counts = np.maximum(innerPoints - 1, 0)
+        i = np.repeat(np.arange(len(sharp_points) - 1), counts)
+        k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+        tStep = 1.0 / innerPoints
+        t = tStep[i] * k
+
+        #...between first and second sharp points or between the last two sharp 
+        #points use linear interpolation, in the middle of four sharp points 
+        #use Catmull-Rom
+        linear = (i == 0) | (i == len(sharp_points) - 2)
+        before = np.maximum(i - 1, 0)
+        after = np.minimum(i + 2, len(sharp_points) - 1)
+        lerp_x, lerp_y = self.lerp( (sharp_x[i], sharp_y[i]), (sharp_x[i + 1], sharp_y[i + 1]), t )
+        spline_x, spline_y = self.catmullRom( (sharp_x[before], sharp_y[before]), (sharp_x[i], sharp_y[i]),
+                                              (sharp_x[i + 1], sharp_y[i + 1]), (sharp_x[after], sharp_y[after]), t )
+
+        #each sharp point followed by the points after it
+        starts = np.arange(len(sharp_points)) + np.concatenate( ([0], np.cumsum(counts)) )
+        new_points = np.empty( (len(sharp_points) + counts.sum(), 2) )
+        new_points[starts, 0] = sharp_x
+        new_points[starts, 1] = sharp_y
+        new_points[starts[i] + k, 0] = np.where(linear, lerp_x, spline_x)
+        new_points[starts[i] + k, 1] = np.where(linear, lerp_y, spline_y)
               
         #now replace
         self.points = new_points
-        
+
     #relocate points in the trace based on two boxes, 
     #one to define and clamp current values
     #and the second to relocate values inside of it
@@ -379,28 +448,22 @@ class TraceInfo:
             inputHeight = 0.02  
         
         #for all points ... 
-        for i in range(len(self.points)):
-            #clamp (just to keep the function as general as possible)
-            #minX
-            if self.points[i][0] < inputBox[0]:
-                self.points[i] = (inputBox[0], self.points[i][1])
-            #maxX
-            if self.points[i][0] > inputBox[1]:                
-                self.points[i] = (inputBox[1], self.points[i][1])
-                
-            #minY
-            if self.points[i][1] < inputBox[2]:
-                self.points[i] = (self.points[i][0], inputBox[2])
-            #maxX
-            if self.points[i][1] > inputBox[3]:                
-                self.points[i] = (self.points[i][0], inputBox[3])
+        x, y = self.array[:, 0], self.array[:, 1]
+
+        #clamp (just to keep the function as general as possible)
+        #minX, maxX
+        x = np.where(x < inputBox[0], inputBox[0], x)
+        x = np.where(x > inputBox[1], inputBox[1], x)
+        #minY, maxY
+        y = np.where(y < inputBox[2], inputBox[2], y)
+        y = np.where(y > inputBox[3], inputBox[3], y)
                         
-            #new Coordinates
-            x = ((self.points[i][0] - inputBox[0]) / (inputWidth)) * outputWidth + outputBox[0]
-            y = ((self.points[i][1] - inputBox[2]) / (inputHeight)) * outputHeight + outputBox[2]
+        #new Coordinates
+        x = ((x - inputBox[0]) / (inputWidth)) * outputWidth + outputBox[0]
+        y = ((y - inputBox[2]) / (inputHeight)) * outputHeight + outputBox[2]
             
-            #replace...
-            self.points[i] = (x, y)
+        #replace...
+        self.points = np.column_stack( (x, y) )
             
         #update sharp points...
         for i in range(len(self.sharp_points)):